@@ -0,0 +1,51 @@
+"""Capacity-constrained allocation of district biomass to plants.
+
+Supply sits at district centroids, demand at plants. Only pairs closer
+than the transport radius are ever considered: each centroid asks the
+plant KD-tree for the plants within the radius, which gives a sparse
+list of candidate routes instead of a dense districts x plants matrix.
+The routes are then filled cheapest first, each carrying as much as its
+district has left and its plant still needs. Greedy filling is not an
+optimal transport solution, but it never exceeds a supply or a demand,
+always prefers nearer plants and runs in ``O(routes log routes)``.
+"""
+import numpy as np
+
+from geo import chord_to_km, km_to_chord, to_unit_vectors
+
+
+def candidate_routes(spatial_index, lat, lon, radius_km, circuity=1.0):
+    """Return ``(origins, plants, km)`` for every origin-plant pair within ``radius_km``.
+
+    ``plants`` index ``spatial_index.plants``; distances are great-circle
+    km times ``circuity`` and the radius applies to that road estimate.
+    """
+    chord = float(km_to_chord(radius_km / circuity))
+    origins, plants, chords = [], [], []
+    for i, point in enumerate(to_unit_vectors(lat, lon).reshape(-1, 3)):
+        found, indices = spatial_index.tree.query_radius(point, chord)
+        if len(indices):
+            origins.append(np.full(len(indices), i))
+            plants.append(indices)
+            chords.append(found)
+    if not origins:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int), np.empty(0)
+    return (np.concatenate(origins), np.concatenate(plants),
+            chord_to_km(np.concatenate(chords)) * circuity)
+
+
+def greedy_allocate(supply, demand, origins, plants, cost):
+    """Fill routes in order of ``cost``; returns the amount carried by each route."""
+    order = np.lexsort((plants, origins, cost))
+    remaining_supply = np.asarray(supply, dtype=float).tolist()
+    remaining_demand = np.asarray(demand, dtype=float).tolist()
+    origin_list, plant_list = origins.tolist(), plants.tolist()
+    amounts = np.zeros(len(cost))
+    for k in order.tolist():
+        i, j = origin_list[k], plant_list[k]
+        amount = min(remaining_supply[i], remaining_demand[j])
+        if amount > 0:
+            amounts[k] = amount
+            remaining_supply[i] -= amount
+            remaining_demand[j] -= amount
+    return amounts
@@ -1,623 +1,709 @@
-from flask import Flask, render_template, jsonify, request, send_from_directory
-import pandas as pd
+from flask import Flask, Response, g, render_template, jsonify, request, send_file, send_from_directory
+import click
+import numpy as np
 import os
+import glob
+import hmac
+import math
+import itertools
+import orjson
 import requests
+from flask_caching import Cache
+
+import biomass
+import routing
+import time
+from concurrent.futures import ThreadPoolExecutor
+import snapshot
+from datasets import DatasetRegistry, is_temporary, require_columns
+from district_index import DistrictIndex, DistrictPolygons, state_key
+from geocode import GeocodeCache, Geocoder
+from geometry import DETAIL_TOLERANCES, FORMATS, GeometryStore, detail_for_zoom
+from responses import PrecompressedJSON, dumps
+from search import PlantSearchIndex
+from response_cache import ResponseCache
+import tiles
+import profiling
+import allocation
+from metrics import Metrics
+from geo import PlantSpatialIndex, distance_matrix_blocks, haversine_km
+from upstream import CircuitBreaker, LatencyStats, TTLCache, make_session
 
 
 app = Flask(__name__)
 
+# Directory holding the workbooks; defaults to the repository root.
+DATA_DIR = os.environ.get('DATA_DIR', os.path.dirname(os.path.abspath(__file__)))
+
+# Persistent geocode cache shared by all workers; see `flask geocode-plants`.
+GEOCODE_CACHE_FILE = os.environ.get('GEOCODE_CACHE_FILE', 'geocode_cache.sqlite3')
+GEOCODE_TTL_DAYS = float(os.environ.get('GEOCODE_TTL_DAYS', 90))
+GEOCODE_CACHE_SIZE = int(os.environ.get('GEOCODE_CACHE_SIZE', 50000))
+GEOCODE_MIN_INTERVAL = float(os.environ.get('GEOCODE_MIN_INTERVAL', 1.0))
+
+# Outbound HTTP: (connect, read) timeouts in seconds and retries per call.
+UPSTREAM_TIMEOUT = (float(os.environ.get('UPSTREAM_CONNECT_TIMEOUT', 3.05)),
+                    float(os.environ.get('UPSTREAM_READ_TIMEOUT', 10)))
+UPSTREAM_RETRIES = int(os.environ.get('UPSTREAM_RETRIES', 2))
+# Concurrent route lookups per /api/distance/batch request, and pairs allowed per request.
+DISTANCE_BATCH_CONCURRENCY = int(os.environ.get('DISTANCE_BATCH_CONCURRENCY', 8))
+DISTANCE_BATCH_MAX_PAIRS = int(os.environ.get('DISTANCE_BATCH_MAX_PAIRS', 500))
+# Largest origins x destinations matrix per /api/distance/matrix request. It is
+# streamed in blocks of bounded size, so this only limits the response length
+# (a 5000 x 5000 matrix is about 215 MB of JSON).
+DISTANCE_MATRIX_MAX_CELLS = int(os.environ.get('DISTANCE_MATRIX_MAX_CELLS', 25000000))
+
+# Local road graph for /api/distance (see `flask build-road-graph`).
+ROAD_GRAPH_FILE = os.environ.get('ROAD_GRAPH_FILE', 'road_graph.npz')
+ROAD_SNAP_KM = float(os.environ.get('ROAD_SNAP_KM', 10))
+# Remote OSRM server used when the local graph cannot answer; empty disables it.
+OSRM_URL = os.environ.get('OSRM_URL', 'http://router.project-osrm.org').rstrip('/')
+
+# Route results are cached per coordinate pair rounded to this many decimals.
+ROUTE_CACHE_PRECISION = int(os.environ.get('ROUTE_CACHE_PRECISION', 4))
+ROUTE_CACHE_SIZE = int(os.environ.get('ROUTE_CACHE_SIZE', 20000))
+ROUTE_CACHE_TTL = float(os.environ.get('ROUTE_CACHE_TTL', 7 * 86400))
+# After this many consecutive OSRM failures, serve estimates for the cooldown.
+OSRM_BREAKER_THRESHOLD = int(os.environ.get('OSRM_BREAKER_THRESHOLD', 5))
+OSRM_BREAKER_COOLDOWN = float(os.environ.get('OSRM_BREAKER_COOLDOWN', 30))
+
+# Road distance / great-circle distance; 1.0 returns plain haversine km.
+ROAD_CIRCUITY_FACTOR = float(os.environ.get('ROAD_CIRCUITY_FACTOR', 1.0))
+
+# Defaults for /api/allocation: transport radius and biomass demand per plant.
+ALLOCATION_RADIUS_KM = float(os.environ.get('ALLOCATION_RADIUS_KM', 100))
+ALLOCATION_MAX_RADIUS_KM = float(os.environ.get('ALLOCATION_MAX_RADIUS_KM', 1000))
+ALLOCATION_PLANT_DEMAND_KT = float(os.environ.get('ALLOCATION_PLANT_DEMAND_KT', 10))
+
+# Rendered vector tiles; see `flask seed-tiles`.
+TILE_CACHE_DIR = os.environ.get('TILE_CACHE_DIR', os.path.join(DATA_DIR, 'tile_cache'))
+TILE_MAX_ZOOM = int(os.environ.get('TILE_MAX_ZOOM', 14))
+DISTRICT_TILE_MIN_ZOOM = int(os.environ.get('DISTRICT_TILE_MIN_ZOOM', 5))
+TILE_MAX_AGE = int(os.environ.get('TILE_MAX_AGE', 3600))
+
+# Shared directory for per-process metric snapshots (multi-worker servers);
+# clear it when the server starts. Unset: each process reports only itself.
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+
+metrics = Metrics(METRICS_DIR)
+REQUEST_SECONDS = metrics.histogram('http_request_duration_seconds',
+                                    'Time to produce a response, by route, method and status.')
+LOADER_SECONDS = metrics.histogram('loader_duration_seconds', 'Time spent in each data loader.',
+                                   buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120))
+UPSTREAM_SECONDS = metrics.histogram('upstream_request_duration_seconds',
+                                     'Outbound OSRM and Nominatim requests, by service and outcome.')
+
+# Response cache for the per-state/per-district endpoints (Flask-Caching):
+# SimpleCache (per process), FileSystemCache (CACHE_DIR, shared by workers),
+# RedisCache (CACHE_REDIS_URL, any Redis-protocol server; needs the redis
+# package) or NullCache to turn it off.
+app.config.from_mapping(
+    CACHE_TYPE=os.environ.get('CACHE_TYPE', 'SimpleCache'),
+    CACHE_DEFAULT_TIMEOUT=int(os.environ.get('CACHE_DEFAULT_TIMEOUT', 3600)),
+    CACHE_THRESHOLD=int(os.environ.get('CACHE_THRESHOLD', 2000)),
+    CACHE_DIR=os.environ.get('CACHE_DIR', os.path.join(DATA_DIR, 'response_cache')),
+    CACHE_REDIS_URL=os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0'),
+    CACHE_KEY_PREFIX=os.environ.get('CACHE_KEY_PREFIX', 'biomass-map:'),
+)
+
+# Opt-in request profiling: with PROFILING=1, a request carrying
+# "X-Profile: <PROFILE_SECRET>" is profiled, and so is one request in every
+# PROFILE_SAMPLE_EVERY (0 = never). Profiles are written to PROFILE_DIR.
+PROFILING = os.environ.get('PROFILING', '').lower() in ('1', 'true', 'yes')
+PROFILE_SECRET = os.environ.get('PROFILE_SECRET', '')
+PROFILE_SAMPLE_EVERY = int(os.environ.get('PROFILE_SAMPLE_EVERY', 0))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(DATA_DIR, 'profiles'))
+PROFILE_FORMAT = os.environ.get('PROFILE_FORMAT', 'speedscope')
+PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', 1))
+_profile_counter = itertools.count(1)
+
+cache = Cache(app)
+view_cache = ResponseCache(cache)
+
+route_cache = TTLCache(maxsize=ROUTE_CACHE_SIZE, ttl=ROUTE_CACHE_TTL)
+osrm_breaker = CircuitBreaker(threshold=OSRM_BREAKER_THRESHOLD, cooldown=OSRM_BREAKER_COOLDOWN)
+osrm_latency = LatencyStats()
+
+# Per-process upstream clients: sockets and SQLite handles must not cross a fork.
+_upstream = {'pid': None, 'session': None, 'geocoder': None, 'executor': None}
+
+def _observe_nominatim(seconds, ok):
+    UPSTREAM_SECONDS.observe(seconds, service='nominatim', outcome='ok' if ok else 'error')
+
+def _upstream_clients():
+    if _upstream['pid'] != os.getpid():
+        session = make_session(retries=UPSTREAM_RETRIES)
+        cache = GeocodeCache(os.path.join(DATA_DIR, GEOCODE_CACHE_FILE),
+                             ttl=GEOCODE_TTL_DAYS * 86400, max_entries=GEOCODE_CACHE_SIZE)
+        _upstream['session'] = session
+        _upstream['executor'] = ThreadPoolExecutor(max_workers=DISTANCE_BATCH_CONCURRENCY,
+                                                   thread_name_prefix='distance')
+        _upstream['geocoder'] = Geocoder(cache, min_interval=GEOCODE_MIN_INTERVAL,
+                                         timeout=UPSTREAM_TIMEOUT, session=session,
+                                         observer=_observe_nominatim)
+        _upstream['pid'] = os.getpid()
+    return _upstream
+
+def get_session():
+    """Return this process's pooled HTTP session."""
+    return _upstream_clients()['session']
+
+def get_geocoder():
+    """Return this process's Geocoder."""
+    return _upstream_clients()['geocoder']
+
+def get_executor():
+    """Return this process's bounded pool for concurrent upstream calls."""
+    return _upstream_clients()['executor']
+
 def get_coords(city):
     """Geocode a city to get its latitude and longitude using Nominatim."""
-    url = f"https://nominatim.openstreetmap.org/search?q={city}&format=json"
-    headers = {'User-Agent': 'biomass-map-app'} # Nominatim requires a user agent
-    response = requests.get(url, headers=headers)
-    response.raise_for_status()
-    data = response.json()
-    if data:
-        return data[0]['lat'], data[0]['lon']
-    return None, None
+    return get_geocoder().lookup(city)
 
-def load_plant_data():
-    """Load and process the plant data from data.xlsx"""
-    try:
-        df = pd.read_excel('data.xlsx')
-        df = df.fillna('')
-        df.columns = df.columns.astype(str).str.strip()
-        
-        plants_by_state = {}
-        for state, group in df.groupby('State'):
-            state = str(state).strip()
-            if state:
-                plants_by_state[state] = [
-                    {k.strip(): str(v).strip() if isinstance(v, str) else v 
-                     for k, v in row.items()}
-                    for _, row in group.iterrows()
-                ]
-        return plants_by_state
-    except Exception as e:
-        print(f"Error loading plant data: {str(e)}")
-        return {}
+# Columns the plant endpoints read; a workbook without them is rejected.
+PLANT_COLUMNS = ('State', 'City/ District', 'Sponge Iron Plant', 'Latitude', 'Longitude')
 
+@LOADER_SECONDS.time(loader='load_steel_plant_data')
 def load_steel_plant_data():
     """Load and process the steel iron plant data from data.xlsx"""
-    try:
-        df = pd.read_excel('data.xlsx')
-        df = df.fillna('')
-        df.columns = df.columns.astype(str).str.strip()
-        plants_by_state = {}
-        for state, group in df.groupby('State'):
-            state = str(state).strip()
-            if state:
-                plants_by_state[state] = [
-                    {k.strip(): str(v).strip() if isinstance(v, str) else v 
-                     for k, v in row.items()}
-                    for _, row in group.iterrows()
-                ]
-        return plants_by_state
-    except Exception as e:
-        print(f"Error loading steel plant data: {str(e)}")
-        return {}
+    path = os.path.join(DATA_DIR, 'data.xlsx')
+    df = snapshot.read_excel(path)
+    df = df.fillna('')
+    df.columns = df.columns.astype(str).str.strip()
+    require_columns(df.columns, PLANT_COLUMNS, path)
+    plants_by_state = {}
+    for state, group in df.groupby('State'):
+        state = str(state).strip()
+        if state:
+            plants_by_state[state] = [
+                {k.strip(): str(v).strip() if isinstance(v, str) else v 
+                 for k, v in row.items()}
+                for _, row in group.iterrows()
+            ]
+    return plants_by_state
 
+@LOADER_SECONDS.time(loader='load_sponge_plant_data')
 def load_sponge_plant_data():
     """Load and process the sponge iron plant data from Sponge_Iron_Plants.xlsx"""
-    try:
-        df = pd.read_excel('Sponge_Iron_Plants.xlsx')
-        df = df.fillna('')
-        df.columns = df.columns.astype(str).str.strip()
-        plants_by_state = {}
-        for state, group in df.groupby('State'):
-            state = str(state).strip()
-            if state:
-                plants_by_state[state] = [
-                    {k.strip(): str(v).strip() if isinstance(v, str) else v 
-                     for k, v in row.items()}
-                    for _, row in group.iterrows()
-                ]
-        return plants_by_state
-    except Exception as e:
-        print(f"Error loading sponge iron plant data: {str(e)}")
-        return {}
+    path = os.path.join(DATA_DIR, 'Sponge_Iron_Plants.xlsx')
+    df = snapshot.read_excel(path)
+    df = df.fillna('')
+    df.columns = df.columns.astype(str).str.strip()
+    require_columns(df.columns, PLANT_COLUMNS, path)
+    plants_by_state = {}
+    for state, group in df.groupby('State'):
+        state = str(state).strip()
+        if state:
+            plants_by_state[state] = [
+                {k.strip(): str(v).strip() if isinstance(v, str) else v 
+                 for k, v in row.items()}
+                for _, row in group.iterrows()
+            ]
+    return plants_by_state
 
+@LOADER_SECONDS.time(loader='load_all_biomass_data')
 def load_all_biomass_data():
     """Load biomass data for all states"""
-    try:
-        biomass_data = {}
-        
-        # Load Odisha biomass data
-        odisha_file = 'Odisha_biomass.xlsx'
-        if os.path.exists(odisha_file):
-            df = pd.read_excel(odisha_file, header=[0, 1])
-            districts = df.iloc[:, 0]
-            odisha_data = []
-            
-            for index, row in df.iterrows():
-                district_data = {
-                    'state': 'Odisha',
-                    'district': districts[index],
-                    'bioenergy_potential': {
-                        'kharif_rice': float(row[('Bioenergy Potential GJ', 'Kharif Rice')]),
-                        'rabi_rice': float(row[('Bioenergy Potential GJ', 'Rabi Rice')]),
-                        'wheat': float(row[('Bioenergy Potential GJ', 'Wheat')]),
-                        'cotton': float(row[('Bioenergy Potential GJ', 'Cotton')]),
-                        'sugarcane': float(row[('Bioenergy Potential GJ', 'Sugarcane')])
-                    },
-                    'gross_biomass': {
-                        'kharif_rice': float(row[('Gross Biomass Kilo tonnes', 'Kharif Rice')]),
-                        'rabi_rice': float(row[('Gross Biomass Kilo tonnes', 'Rabi Rice')]),
-                        'wheat': float(row[('Gross Biomass Kilo tonnes', 'Wheat')]),
-                        'cotton': float(row[('Gross Biomass Kilo tonnes', 'Cotton')]),
-                        'sugarcane': float(row[('Gross Biomass Kilo tonnes', 'Sugarcane')])
-                    },
-                    'surplus_biomass': {
-                        'kharif_rice': float(row[('Surplus Biomass Kilo tonnes', 'Kharif Rice')]),
-                        'rabi_rice': float(row[('Surplus Biomass Kilo tonnes', 'Rabi Rice')]),
-                        'wheat': float(row[('Surplus Biomass Kilo tonnes', 'Wheat')]),
-                        'cotton': float(row[('Surplus Biomass Kilo tonnes', 'Cotton')]),
-                        'sugarcane': float(row[('Surplus Biomass Kilo tonnes', 'Sugarcane')])
-                    }
-                }
-                odisha_data.append(district_data)
-            biomass_data['Odisha'] = odisha_data
-        
-        # Load Himachal Pradesh biomass data
-        himachal_file = 'Himachal_Pradesh_biomass.xlsx'
-        if os.path.exists(himachal_file):
-            df = pd.read_excel(himachal_file, header=[0, 1])
-            districts = df.iloc[:, 0]
-            himachal_data = []
-            
-            for index, row in df.iterrows():
-                district_data = {
-                    'state': 'Himachal Pradesh',
-                    'district': districts[index],
-                    'bioenergy_potential': {
-                        'kharif_rice': float(row[('Bioenergy Potential GJ', 'Kharif Rice')]),
-                        'rabi_rice': float(row[('Bioenergy Potential GJ', 'Rabi Rice')]),
-                        'wheat': float(row[('Bioenergy Potential GJ', 'Wheat')]),
-                        'cotton': float(row[('Bioenergy Potential GJ', 'Cotton')]),
-                        'sugarcane': float(row[('Bioenergy Potential GJ', 'Sugarcane')])
-                    },
-                    'gross_biomass': {
-                        'kharif_rice': float(row[('Gross Biomass Kilo tonnes', 'Kharif Rice')]),
-                        'rabi_rice': float(row[('Gross Biomass Kilo tonnes', 'Rabi Rice')]),
-                        'wheat': float(row[('Gross Biomass Kilo tonnes', 'Wheat')]),
-                        'cotton': float(row[('Gross Biomass Kilo tonnes', 'Cotton')]),
-                        'sugarcane': float(row[('Gross Biomass Kilo tonnes', 'Sugarcane')])
-                    },
-                    'surplus_biomass': {
-                        'kharif_rice': float(row[('Surplus Biomass Kilo tonnes', 'Kharif Rice')]),
-                        'rabi_rice': float(row[('Surplus Biomass Kilo tonnes', 'Rabi Rice')]),
-                        'wheat': float(row[('Surplus Biomass Kilo tonnes', 'Wheat')]),
-                        'cotton': float(row[('Surplus Biomass Kilo tonnes', 'Cotton')]),
-                        'sugarcane': float(row[('Surplus Biomass Kilo tonnes', 'Sugarcane')])
-                    }
-                }
-                himachal_data.append(district_data)
-            biomass_data['Himachal Pradesh'] = himachal_data
-
-        # Load Goa biomass data
-        goa_file = 'Goa_biomass.xlsx'
-        if os.path.exists(goa_file):
-            df = pd.read_excel(goa_file, header=[0, 1])
-            districts = df.iloc[:, 0]
-            goa_data = []
-            
-            for index, row in df.iterrows():
-                district_data = {
-                    'state': 'Goa',
-                    'district': districts[index],
-                    'bioenergy_potential': {
-                        'kharif_rice': float(row[('Bioenergy Potential GJ', 'Kharif Rice')]),
-                        'rabi_rice': float(row[('Bioenergy Potential GJ', 'Rabi Rice')]),
-                        'wheat': float(row[('Bioenergy Potential GJ', 'Wheat')]),
-                        'cotton': float(row[('Bioenergy Potential GJ', 'Cotton')]),
-                        'sugarcane': float(row[('Bioenergy Potential GJ', 'Sugarcane')])
-                    },
-                    'gross_biomass': {
-                        'kharif_rice': float(row[('Gross Biomass Kilo tonnes', 'Kharif Rice')]),
-                        'rabi_rice': float(row[('Gross Biomass Kilo tonnes', 'Rabi Rice')]),
-                        'wheat': float(row[('Gross Biomass Kilo tonnes', 'Wheat')]),
-                        'cotton': float(row[('Gross Biomass Kilo tonnes', 'Cotton')]),
-                        'sugarcane': float(row[('Gross Biomass Kilo tonnes', 'Sugarcane')])
-                    },
-                    'surplus_biomass': {
-                        'kharif_rice': float(row[('Surplus Biomass Kilo tonnes', 'Kharif Rice')]),
-                        'rabi_rice': float(row[('Surplus Biomass Kilo tonnes', 'Rabi Rice')]),
-                        'wheat': float(row[('Surplus Biomass Kilo tonnes', 'Wheat')]),
-                        'cotton': float(row[('Surplus Biomass Kilo tonnes', 'Cotton')]),
-                        'sugarcane': float(row[('Surplus Biomass Kilo tonnes', 'Sugarcane')])
-                    }
-                }
-                goa_data.append(district_data)
-            biomass_data['Goa'] = goa_data
-
-        # Load Tripura biomass data
-        tripura_file = 'Tripura_biomass.xlsx'
-        if os.path.exists(tripura_file):
-            df = pd.read_excel(tripura_file, header=[0, 1])
-            districts = df.iloc[:, 0]
-            tripura_data = []
-            
-            for index, row in df.iterrows():
-                district_data = {
-                    'state': 'Tripura',
-                    'district': districts[index],
-                    'bioenergy_potential': {
-                        'kharif_rice': float(row[('Bioenergy Potential GJ', 'Kharif Rice')]),
-                        'rabi_rice': float(row[('Bioenergy Potential GJ', 'Rabi Rice')]),
-                        'wheat': float(row[('Bioenergy Potential GJ', 'Wheat')]),
-                        'cotton': float(row[('Bioenergy Potential GJ', 'Cotton')]),
-                        'sugarcane': float(row[('Bioenergy Potential GJ', 'Sugarcane')])
-                    },
-                    'gross_biomass': {
-                        'kharif_rice': float(row[('Gross Biomass Kilo tonnes', 'Kharif Rice')]),
-                        'rabi_rice': float(row[('Gross Biomass Kilo tonnes', 'Rabi Rice')]),
-                        'wheat': float(row[('Gross Biomass Kilo tonnes', 'Wheat')]),
-                        'cotton': float(row[('Gross Biomass Kilo tonnes', 'Cotton')]),
-                        'sugarcane': float(row[('Gross Biomass Kilo tonnes', 'Sugarcane')])
-                    },
-                    'surplus_biomass': {
-                        'kharif_rice': float(row[('Surplus Biomass Kilo tonnes', 'Kharif Rice')]),
-                        'rabi_rice': float(row[('Surplus Biomass Kilo tonnes', 'Rabi Rice')]),
-                        'wheat': float(row[('Surplus Biomass Kilo tonnes', 'Wheat')]),
-                        'cotton': float(row[('Surplus Biomass Kilo tonnes', 'Cotton')]),
-                        'sugarcane': float(row[('Surplus Biomass Kilo tonnes', 'Sugarcane')])
-                    }
-                }
-                tripura_data.append(district_data)
-            biomass_data['Tripura'] = tripura_data
-
-        # Load Sikkim biomass data
-        sikkim_file = 'Sikkim_biomass.xlsx'
-        if os.path.exists(sikkim_file):
-            df = pd.read_excel(sikkim_file, header=[0, 1])
-            districts = df.iloc[:, 0]
-            sikkim_data = []
-            
-            for index, row in df.iterrows():
-                district_data = {
-                    'state': 'Sikkim',
-                    'district': districts[index],
-                    'bioenergy_potential': {
-                        'kharif_rice': float(row[('Bioenergy Potential GJ', 'Kharif Rice')]),
-                        'rabi_rice': float(row[('Bioenergy Potential GJ', 'Rabi Rice')]),
-                        'wheat': float(row[('Bioenergy Potential GJ', 'Wheat')]),
-                        'cotton': float(row[('Bioenergy Potential GJ', 'Cotton')]),
-                        'sugarcane': float(row[('Bioenergy Potential GJ', 'Sugarcane')])
-                    },
-                    'gross_biomass': {
-                        'kharif_rice': float(row[('Gross Biomass Kilo tonnes', 'Kharif Rice')]),
-                        'rabi_rice': float(row[('Gross Biomass Kilo tonnes', 'Rabi Rice')]),
-                        'wheat': float(row[('Gross Biomass Kilo tonnes', 'Wheat')]),
-                        'cotton': float(row[('Gross Biomass Kilo tonnes', 'Cotton')]),
-                        'sugarcane': float(row[('Gross Biomass Kilo tonnes', 'Sugarcane')])
-                    },
-                    'surplus_biomass': {
-                        'kharif_rice': float(row[('Surplus Biomass Kilo tonnes', 'Kharif Rice')]),
-                        'rabi_rice': float(row[('Surplus Biomass Kilo tonnes', 'Rabi Rice')]),
-                        'wheat': float(row[('Surplus Biomass Kilo tonnes', 'Wheat')]),
-                        'cotton': float(row[('Surplus Biomass Kilo tonnes', 'Cotton')]),
-                        'sugarcane': float(row[('Surplus Biomass Kilo tonnes', 'Sugarcane')])
-                    }
-                }
-                sikkim_data.append(district_data)
-            biomass_data['Sikkim'] = sikkim_data
-
-        # Load Puducherry biomass data
-        puducherry_file = 'Puducherry_biomass.xlsx'
-        if os.path.exists(puducherry_file):
-            df = pd.read_excel(puducherry_file, header=[0, 1])
-            districts = df.iloc[:, 0]
-            puducherry_data = []
-            
-            for index, row in df.iterrows():
-                district_data = {
-                    'state': 'Puducherry',
-                    'district': districts[index],
-                    'bioenergy_potential': {
-                        'kharif_rice': float(row[('Bioenergy Potential GJ', 'Kharif Rice')]),
-                        'rabi_rice': float(row[('Bioenergy Potential GJ', 'Rabi Rice')]),
-                        'wheat': float(row[('Bioenergy Potential GJ', 'Wheat')]),
-                        'cotton': float(row[('Bioenergy Potential GJ', 'Cotton')]),
-                        'sugarcane': float(row[('Bioenergy Potential GJ', 'Sugarcane')])
-                    },
-                    'gross_biomass': {
-                        'kharif_rice': float(row[('Gross Biomass Kilo tonnes', 'Kharif Rice')]),
-                        'rabi_rice': float(row[('Gross Biomass Kilo tonnes', 'Rabi Rice')]),
-                        'wheat': float(row[('Gross Biomass Kilo tonnes', 'Wheat')]),
-                        'cotton': float(row[('Gross Biomass Kilo tonnes', 'Cotton')]),
-                        'sugarcane': float(row[('Gross Biomass Kilo tonnes', 'Sugarcane')])
-                    },
-                    'surplus_biomass': {
-                        'kharif_rice': float(row[('Surplus Biomass Kilo tonnes', 'Kharif Rice')]),
-                        'rabi_rice': float(row[('Surplus Biomass Kilo tonnes', 'Rabi Rice')]),
-                        'wheat': float(row[('Surplus Biomass Kilo tonnes', 'Wheat')]),
-                        'cotton': float(row[('Surplus Biomass Kilo tonnes', 'Cotton')]),
-                        'sugarcane': float(row[('Surplus Biomass Kilo tonnes', 'Sugarcane')])
-                    }
-                }
-                puducherry_data.append(district_data)
-            biomass_data['Puducherry'] = puducherry_data
-
-        # Load Meghalaya biomass data
-        meghalaya_file = 'Meghalaya_biomass.xlsx'
-        if os.path.exists(meghalaya_file):
-            df = pd.read_excel(meghalaya_file, header=[0, 1])
-            districts = df.iloc[:, 0]
-            meghalaya_data = []
-            
-            for index, row in df.iterrows():
-                district_data = {
-                    'state': 'Meghalaya',
-                    'district': districts[index],
-                    'bioenergy_potential': {
-                        'kharif_rice': float(row[('Bioenergy Potential GJ', 'Kharif Rice')]),
-                        'rabi_rice': float(row[('Bioenergy Potential GJ', 'Rabi Rice')]),
-                        'wheat': float(row[('Bioenergy Potential GJ', 'Wheat')]),
-                        'cotton': float(row[('Bioenergy Potential GJ', 'Cotton')]),
-                        'sugarcane': float(row[('Bioenergy Potential GJ', 'Sugarcane')])
-                    },
-                    'gross_biomass': {
-                        'kharif_rice': float(row[('Gross Biomass Kilo tonnes', 'Kharif Rice')]),
-                        'rabi_rice': float(row[('Gross Biomass Kilo tonnes', 'Rabi Rice')]),
-                        'wheat': float(row[('Gross Biomass Kilo tonnes', 'Wheat')]),
-                        'cotton': float(row[('Gross Biomass Kilo tonnes', 'Cotton')]),
-                        'sugarcane': float(row[('Gross Biomass Kilo tonnes', 'Sugarcane')])
-                    },
-                    'surplus_biomass': {
-                        'kharif_rice': float(row[('Surplus Biomass Kilo tonnes', 'Kharif Rice')]),
-                        'rabi_rice': float(row[('Surplus Biomass Kilo tonnes', 'Rabi Rice')]),
-                        'wheat': float(row[('Surplus Biomass Kilo tonnes', 'Wheat')]),
-                        'cotton': float(row[('Surplus Biomass Kilo tonnes', 'Cotton')]),
-                        'sugarcane': float(row[('Surplus Biomass Kilo tonnes', 'Sugarcane')])
-                    }
-                }
-                meghalaya_data.append(district_data)
-            biomass_data['Meghalaya'] = meghalaya_data
-
-        # Load Mizoram biomass data
-        mizoram_file = 'Mizoram_biomass.xlsx'
-        if os.path.exists(mizoram_file):
-            df = pd.read_excel(mizoram_file, header=[0, 1])
-            districts = df.iloc[:, 0]
-            mizoram_data = []
-            
-            for index, row in df.iterrows():
-                district_data = {
-                    'state': 'Mizoram',
-                    'district': districts[index],
-                    'bioenergy_potential': {
-                        'kharif_rice': float(row[('Bioenergy Potential GJ', 'Kharif Rice')]),
-                        'rabi_rice': float(row[('Bioenergy Potential GJ', 'Rabi Rice')]),
-                        'wheat': float(row[('Bioenergy Potential GJ', 'Wheat')]),
-                        'cotton': float(row[('Bioenergy Potential GJ', 'Cotton')]),
-                        'sugarcane': float(row[('Bioenergy Potential GJ', 'Sugarcane')])
-                    },
-                    'gross_biomass': {
-                        'kharif_rice': float(row[('Gross Biomass Kilo tonnes', 'Kharif Rice')]),
-                        'rabi_rice': float(row[('Gross Biomass Kilo tonnes', 'Rabi Rice')]),
-                        'wheat': float(row[('Gross Biomass Kilo tonnes', 'Wheat')]),
-                        'cotton': float(row[('Gross Biomass Kilo tonnes', 'Cotton')]),
-                        'sugarcane': float(row[('Gross Biomass Kilo tonnes', 'Sugarcane')])
-                    },
-                    'surplus_biomass': {
-                        'kharif_rice': float(row[('Surplus Biomass Kilo tonnes', 'Kharif Rice')]),
-                        'rabi_rice': float(row[('Surplus Biomass Kilo tonnes', 'Rabi Rice')]),
-                        'wheat': float(row[('Surplus Biomass Kilo tonnes', 'Wheat')]),
-                        'cotton': float(row[('Surplus Biomass Kilo tonnes', 'Cotton')]),
-                        'sugarcane': float(row[('Surplus Biomass Kilo tonnes', 'Sugarcane')])
-                    }
-                }
-                mizoram_data.append(district_data)
-            biomass_data['Mizoram'] = mizoram_data
-
-        # Load Karnataka biomass data
-        karnataka_file = 'Karnataka_biomass.xlsx'
-        if os.path.exists(karnataka_file):
-            df = pd.read_excel(karnataka_file, header=[0, 1])
-            districts = df.iloc[:, 0]
-            karnataka_data = []
-            
-            for index, row in df.iterrows():
-                district_data = {
-                    'state': 'Karnataka',
-                    'district': districts[index],
-                    'bioenergy_potential': {
-                        'kharif_rice': float(row[('Bioenergy Potential GJ', 'Kharif Rice')]),
-                        'rabi_rice': float(row[('Bioenergy Potential GJ', 'Rabi Rice')]),
-                        'wheat': float(row[('Bioenergy Potential GJ', 'Wheat')]),
-                        'cotton': float(row[('Bioenergy Potential GJ', 'Cotton')]),
-                        'sugarcane': float(row[('Bioenergy Potential GJ', 'Sugarcane')])
-                    },
-                    'gross_biomass': {
-                        'kharif_rice': float(row[('Gross Biomass Kilo tonnes', 'Kharif Rice')]),
-                        'rabi_rice': float(row[('Gross Biomass Kilo tonnes', 'Rabi Rice')]),
-                        'wheat': float(row[('Gross Biomass Kilo tonnes', 'Wheat')]),
-                        'cotton': float(row[('Gross Biomass Kilo tonnes', 'Cotton')]),
-                        'sugarcane': float(row[('Gross Biomass Kilo tonnes', 'Sugarcane')])
-                    },
-                    'surplus_biomass': {
-                        'kharif_rice': float(row[('Surplus Biomass Kilo tonnes', 'Kharif Rice')]),
-                        'rabi_rice': float(row[('Surplus Biomass Kilo tonnes', 'Rabi Rice')]),
-                        'wheat': float(row[('Surplus Biomass Kilo tonnes', 'Wheat')]),
-                        'cotton': float(row[('Surplus Biomass Kilo tonnes', 'Cotton')]),
-                        'sugarcane': float(row[('Surplus Biomass Kilo tonnes', 'Sugarcane')])
-                    }
-                }
-                karnataka_data.append(district_data)
-            biomass_data['Karnataka'] = karnataka_data
-
-        # Load Kerala biomass data
-        kerala_file = 'Kerela_biomass.xlsx'
-        if os.path.exists(kerala_file):
-            df = pd.read_excel(kerala_file, header=[0, 1])
-            districts = df.iloc[:, 0]
-            kerala_data = []
-            
-            for index, row in df.iterrows():
-                district_data = {
-                    'state': 'Kerala',
-                    'district': districts[index],
-                    'bioenergy_potential': {
-                        'kharif_rice': float(row[('Bioenergy Potential GJ', 'Kharif Rice')]),
-                        'rabi_rice': float(row[('Bioenergy Potential GJ', 'Rabi Rice')]),
-                        'wheat': float(row[('Bioenergy Potential GJ', 'Wheat')]),
-                        'cotton': float(row[('Bioenergy Potential GJ', 'Cotton')]),
-                        'sugarcane': float(row[('Bioenergy Potential GJ', 'Sugarcane')])
-                    },
-                    'gross_biomass': {
-                        'kharif_rice': float(row[('Gross Biomass Kilo tonnes', 'Kharif Rice')]),
-                        'rabi_rice': float(row[('Gross Biomass Kilo tonnes', 'Rabi Rice')]),
-                        'wheat': float(row[('Gross Biomass Kilo tonnes', 'Wheat')]),
-                        'cotton': float(row[('Gross Biomass Kilo tonnes', 'Cotton')]),
-                        'sugarcane': float(row[('Gross Biomass Kilo tonnes', 'Sugarcane')])
-                    },
-                    'surplus_biomass': {
-                        'kharif_rice': float(row[('Surplus Biomass Kilo tonnes', 'Kharif Rice')]),
-                        'rabi_rice': float(row[('Surplus Biomass Kilo tonnes', 'Rabi Rice')]),
-                        'wheat': float(row[('Surplus Biomass Kilo tonnes', 'Wheat')]),
-                        'cotton': float(row[('Surplus Biomass Kilo tonnes', 'Cotton')]),
-                        'sugarcane': float(row[('Surplus Biomass Kilo tonnes', 'Sugarcane')])
-                    }
-                }
-                kerala_data.append(district_data)
-            biomass_data['Kerala'] = kerala_data
-
-        # Load Maharashtra biomass data
-        maharashtra_file = 'Maharastra_biomass.xlsx'
-        if os.path.exists(maharashtra_file):
-            df = pd.read_excel(maharashtra_file, header=[0, 1])
-            districts = df.iloc[:, 0]
-            maharashtra_data = []
-            
-            for index, row in df.iterrows():
-                district_data = {
-                    'state': 'Maharashtra',
-                    'district': districts[index],
-                    'bioenergy_potential': {
-                        'kharif_rice': float(row[('Bioenergy Potential GJ', 'Kharif Rice')]),
-                        'rabi_rice': float(row[('Bioenergy Potential GJ', 'Rabi Rice')]),
-                        'wheat': float(row[('Bioenergy Potential GJ', 'Wheat')]),
-                        'cotton': float(row[('Bioenergy Potential GJ', 'Cotton')]),
-                        'sugarcane': float(row[('Bioenergy Potential GJ', 'Sugarcane')])
-                    },
-                    'gross_biomass': {
-                        'kharif_rice': float(row[('Gross Biomass Kilo tonnes', 'Kharif Rice')]),
-                        'rabi_rice': float(row[('Gross Biomass Kilo tonnes', 'Rabi Rice')]),
-                        'wheat': float(row[('Gross Biomass Kilo tonnes', 'Wheat')]),
-                        'cotton': float(row[('Gross Biomass Kilo tonnes', 'Cotton')]),
-                        'sugarcane': float(row[('Gross Biomass Kilo tonnes', 'Sugarcane')])
-                    },
-                    'surplus_biomass': {
-                        'kharif_rice': float(row[('Surplus Biomass Kilo tonnes', 'Kharif Rice')]),
-                        'rabi_rice': float(row[('Surplus Biomass Kilo tonnes', 'Rabi Rice')]),
-                        'wheat': float(row[('Surplus Biomass Kilo tonnes', 'Wheat')]),
-                        'cotton': float(row[('Surplus Biomass Kilo tonnes', 'Cotton')]),
-                        'sugarcane': float(row[('Surplus Biomass Kilo tonnes', 'Sugarcane')])
-                    }
-                }
-                maharashtra_data.append(district_data)
-            biomass_data['Maharashtra'] = maharashtra_data
-
-        # Load Andhra Pradesh biomass data
-        andhra_file = 'Andra_Pradesh_biomass.xlsx'
-        if os.path.exists(andhra_file):
-            df = pd.read_excel(andhra_file, header=[0, 1])
-            districts = df.iloc[:, 0]
-            andhra_data = []
-            
-            for index, row in df.iterrows():
-                district_data = {
-                    'state': 'Andhra Pradesh',
-                    'district': districts[index],
-                    'bioenergy_potential': {
-                        'kharif_rice': float(row[('Bioenergy Potential GJ', 'Kharif Rice')]),
-                        'rabi_rice': float(row[('Bioenergy Potential GJ', 'Rabi Rice')]),
-                        'wheat': float(row[('Bioenergy Potential GJ', 'Wheat')]),
-                        'cotton': float(row[('Bioenergy Potential GJ', 'Cotton')]),
-                        'sugarcane': float(row[('Bioenergy Potential GJ', 'Sugarcane')])
-                    },
-                    'gross_biomass': {
-                        'kharif_rice': float(row[('Gross Biomass Kilo tonnes', 'Kharif Rice')]),
-                        'rabi_rice': float(row[('Gross Biomass Kilo tonnes', 'Rabi Rice')]),
-                        'wheat': float(row[('Gross Biomass Kilo tonnes', 'Wheat')]),
-                        'cotton': float(row[('Gross Biomass Kilo tonnes', 'Cotton')]),
-                        'sugarcane': float(row[('Gross Biomass Kilo tonnes', 'Sugarcane')])
-                    },
-                    'surplus_biomass': {
-                        'kharif_rice': float(row[('Surplus Biomass Kilo tonnes', 'Kharif Rice')]),
-                        'rabi_rice': float(row[('Surplus Biomass Kilo tonnes', 'Rabi Rice')]),
-                        'wheat': float(row[('Surplus Biomass Kilo tonnes', 'Wheat')]),
-                        'cotton': float(row[('Surplus Biomass Kilo tonnes', 'Cotton')]),
-                        'sugarcane': float(row[('Surplus Biomass Kilo tonnes', 'Sugarcane')])
-                    }
-                }
-                andhra_data.append(district_data)
-            biomass_data['Andhra Pradesh'] = andhra_data
-        
-        return biomass_data
-
-    except Exception as e:
-        print(f"Error loading biomass data: {str(e)}")
-        return {}
+    return biomass.load_all(DATA_DIR)
 
-# Keep the old function for backward compatibility
-def load_odisha_biomass_data():
+@LOADER_SECONDS.time(loader='load_biomass_data')
+def load_biomass_data():
     """Load and process the biomass data from the provided Excel file."""
+    file_path = os.path.join(DATA_DIR, 'biomass.xlsx')  # Path to the uploaded biomass file
+    
+    # Read all sheets from the Excel file
+    sheets = snapshot.read_excel(file_path, sheet_name=None)
+    
+    # Process data from all sheets
+    biomass_data = {}
+    for sheet_name, df in sheets.items():
+        df = df.fillna(0)  # Replace NaN with 0 for numeric columns
+        df.columns = df.columns.astype(str).str.strip()  # Strip whitespace from column names
+        require_columns(df.columns, ['States'], f'{file_path}:{sheet_name}')
+        biomass_data[sheet_name] = df.to_dict(orient='records')  # Convert DataFrame to list of dictionaries
+    
+    return biomass_data
+
+def _coordinate(value, limit):
+    """Parse a Latitude/Longitude cell; None if blank or out of range."""
     try:
-        file_path = 'Odisha_biomass.xlsx'
-        # Read Excel file with multi-level headers
-        df = pd.read_excel(file_path, header=[0, 1])
-        
-        # Get the district column (it's typically in the first column)
-        districts = df.iloc[:, 0]  # Get the first column which contains districts
-        
-        result = []
-        
-        for index, row in df.iterrows():
-            district_data = {
-                'district': districts[index],  # Use the district from our separately extracted column
-                'bioenergy_potential': {
-                    'kharif_rice': float(row[('Bioenergy Potential GJ', 'Kharif Rice')]),
-                    'rabi_rice': float(row[('Bioenergy Potential GJ', 'Rabi Rice')]),
-                    'wheat': float(row[('Bioenergy Potential GJ', 'Wheat')]),
-                    'cotton': float(row[('Bioenergy Potential GJ', 'Cotton')]),
-                    'sugarcane': float(row[('Bioenergy Potential GJ', 'Sugarcane')])
-                },
-                'gross_biomass': {
-                    'kharif_rice': float(row[('Gross Biomass Kilo tonnes', 'Kharif Rice')]),
-                    'rabi_rice': float(row[('Gross Biomass Kilo tonnes', 'Rabi Rice')]),
-                    'wheat': float(row[('Gross Biomass Kilo tonnes', 'Wheat')]),
-                    'cotton': float(row[('Gross Biomass Kilo tonnes', 'Cotton')]),
-                    'sugarcane': float(row[('Gross Biomass Kilo tonnes', 'Sugarcane')])
-                },
-                'surplus_biomass': {
-                    'kharif_rice': float(row[('Surplus Biomass Kilo tonnes', 'Kharif Rice')]),
-                    'rabi_rice': float(row[('Surplus Biomass Kilo tonnes', 'Rabi Rice')]),
-                    'wheat': float(row[('Surplus Biomass Kilo tonnes', 'Wheat')]),
-                    'cotton': float(row[('Surplus Biomass Kilo tonnes', 'Cotton')]),
-                    'sugarcane': float(row[('Surplus Biomass Kilo tonnes', 'Sugarcane')])
-                }
-            }
-            result.append(district_data)
-        
-        return result
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if -limit <= value <= limit else None
 
-    except Exception as e:
-        print(f"Error loading Odisha biomass data: {str(e)}")
-        return []
+def build_plant_table(steel_plants, sponge_plants, polygons=None):
+    """Flatten both plant workbooks into one list with stable ids.
 
-def load_biomass_data():
-    """Load and process the biomass data from the provided Excel file."""
+    Each plant gets the ``dt_code`` and ``district`` of the district polygon
+    its coordinates fall in ('' when outside every polygon).
+    """
+    table = []
+    for prefix, plant_type, plants_by_state in (('steel', 'Steel Iron Plant', steel_plants),
+                                                ('sponge', 'Sponge Iron Plant', sponge_plants)):
+        n = 0
+        for state, plants in plants_by_state.items():
+            for plant in plants:
+                table.append({
+                    'id': f'{prefix}-{n}',
+                    'type': plant_type,
+                    'name': plant.get('Sponge Iron Plant', ''),
+                    'city': plant.get('City/ District', ''),
+                    'state': state,
+                    'lat': _coordinate(plant.get('Latitude'), 90),
+                    'lon': _coordinate(plant.get('Longitude'), 180),
+                })
+                n += 1
+    located = [-1] * len(table)
+    if polygons is not None and len(polygons):
+        located = polygons.locate([p['lat'] if p['lat'] is not None else float('nan') for p in table],
+                                  [p['lon'] if p['lon'] is not None else float('nan') for p in table]).tolist()
+    for plant, number in zip(table, located):
+        plant['dt_code'] = polygons.codes[number] if number >= 0 else ''
+        plant['district'] = polygons.districts[number] if number >= 0 else ''
+    return table
+
+def load_road_graph():
+    """Load the local road graph, or None when no graph file is deployed."""
+    path = os.path.join(DATA_DIR, ROAD_GRAPH_FILE)
+    if not os.path.exists(path):
+        return None
+    return routing.RoadGraph.load(path, max_snap_km=ROAD_SNAP_KM)
+
+geometry_store = GeometryStore(os.path.join(app.root_path, 'static', 'geojson'),
+                               orjson.loads)
+STATE_BOUNDARIES = os.path.join(geometry_store.root, 'states', '*.json')
+
+def load_district_polygons():
+    """District polygons of every state file, for the plant -> district join."""
+    root = geometry_store.root
+    files = sorted(os.path.relpath(path, root) for path in glob.glob(STATE_BOUNDARIES))
+    return DistrictPolygons([geometry_store.topology(f) for f in files])
+
+# Every dataset is parsed once and reloaded only when its workbook changes.
+datasets = DatasetRegistry(DATA_DIR, check_interval=float(os.environ.get('DATA_CHECK_INTERVAL', 2)))
+# Check for changed workbooks from a background thread in each server
+# process; 0 checks on access instead, in the request that notices.
+DATA_WATCH = os.environ.get('DATA_WATCH', '1').lower() in ('1', 'true', 'yes')
+datasets.register('steel_plants', ['data.xlsx'], load_steel_plant_data, default={})
+datasets.register('sponge_plants', ['Sponge_Iron_Plants.xlsx'], load_sponge_plant_data, default={})
+datasets.register('all_biomass', [biomass.BIOMASS_PATTERN], load_all_biomass_data,
+                  default=biomass.BiomassTable({}))
+datasets.register('biomass', ['biomass.xlsx'], load_biomass_data, default={})
+datasets.register('district_polygons', [STATE_BOUNDARIES], load_district_polygons)
+datasets.register_derived('plant_table', ['steel_plants', 'sponge_plants', 'district_polygons'],
+                          build_plant_table, default=[])
+datasets.register_derived('plants_by_id', ['plant_table'], lambda table: {p['id']: p for p in table},
+                          default={})
+datasets.register_derived('plant_spatial_index', ['plant_table'], PlantSpatialIndex,
+                          default=PlantSpatialIndex([]))
+datasets.register('road_graph', [ROAD_GRAPH_FILE], load_road_graph)
+# Bulk responses are encoded and compressed once per data version.
+datasets.register_derived('plants_payload', ['steel_plants', 'sponge_plants'],
+                          lambda steel, sponge: PrecompressedJSON({'steel': steel, 'sponge': sponge},
+                                                                  default=app.json.default))
+datasets.register_derived('all_biomass_payload', ['all_biomass'],
+                          lambda data: PrecompressedJSON(data.to_dict(), default=app.json.default) if data else None)
+datasets.register_derived('biomass_cube', ['all_biomass'], biomass.BiomassCube,
+                          default=biomass.BiomassCube(biomass.BiomassTable({})))
+datasets.register_derived('district_index', ['steel_plants', 'all_biomass', 'district_polygons'],
+                          DistrictIndex, default=DistrictIndex({}, biomass.BiomassTable({})))
+
+def dataset_version(*names):
+    """Cache version for views that read ``names`` (see ResponseCache)."""
+    return lambda **view_args: tuple(datasets.version(name) for name in names)
+
+def biomass_state_version(state, **view_args):
+    """Only the state's own workbook, so editing one state keeps the others cached."""
+    stamp = datasets.version('all_biomass')
+    own = [entry for entry in stamp if biomass.state_for_file(entry[0]) == state]
+    # A state without a workbook depends on all of them (one may be added).
+    return own or stamp
+
+@metrics.collector
+def cache_counts():
+    """Hit and miss counts of this process's route and geocode caches."""
+    caches = [('route', route_cache.hits, route_cache.misses),
+              ('response', view_cache.hits, view_cache.misses)]
+    geocoder = _upstream['geocoder'] if _upstream['pid'] == os.getpid() else None
+    if geocoder is not None:
+        caches.append(('geocode', geocoder.hits, geocoder.misses))
+    help = 'Cache lookups by cache and result.'
+    return [('cache_requests_total', help, {'cache': name, 'result': result}, count)
+            for name, hits, misses in caches
+            for result, count in (('hit', hits), ('miss', misses))]
+
+@app.before_request
+def start_data_watcher():
+    if DATA_WATCH:
+        datasets.watch()
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+def _should_profile():
+    if not PROFILING:
+        return False
+    secret = request.headers.get('X-Profile')
+    if secret is not None and PROFILE_SECRET and hmac.compare_digest(secret, PROFILE_SECRET):
+        return True
+    return PROFILE_SAMPLE_EVERY > 0 and next(_profile_counter) % PROFILE_SAMPLE_EVERY == 0
+
+@app.before_request
+def start_profiler():
+    if _should_profile():
+        g.profiler = profiling.StackSampler(interval=PROFILE_INTERVAL_MS / 1000).start()
+
+def _finish_profile():
+    """Stop this request's profiler, if any, and write its profile; returns the path."""
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return None
+    samples = profiler.stop()
+    name = f'{request.method} {request.full_path.rstrip("?")}'
     try:
-        file_path = 'biomass.xlsx'  # Path to the uploaded biomass file
-        
-        # Read all sheets from the Excel file
-        sheets = pd.read_excel(file_path, sheet_name=None)
-        
-        # Process data from all sheets
-        biomass_data = {}
-        for sheet_name, df in sheets.items():
-            df = df.fillna(0)  # Replace NaN with 0 for numeric columns
-            df.columns = df.columns.astype(str).str.strip()  # Strip whitespace from column names
-            biomass_data[sheet_name] = df.to_dict(orient='records')  # Convert DataFrame to list of dictionaries
-        
-        return biomass_data
+        path = profiling.write_profile(PROFILE_DIR, name, samples, PROFILE_FORMAT)
     except Exception as e:
-        print(f"Error loading biomass data: {str(e)}")
-        return {}
+        print(f"Error writing profile: {str(e)}")
+        return None
+    print(f"Profiled {name} ({profiler.duration * 1000:.1f} ms, {len(samples)} samples): {path}")
+    return path
+
+@app.after_request
+def stop_profiler(response):
+    """Profiles cover the view up to the first byte of a streamed body."""
+    path = _finish_profile()
+    if path is not None:
+        response.headers['X-Profile-File'] = os.path.basename(path)
+    return response
+
+@app.teardown_request
+def stop_failed_profiler(exc):
+    # after_request is skipped when a view raises.
+    _finish_profile()
+
+@app.after_request
+def record_request_time(response):
+    """Time to build the response; streamed bodies are timed up to their first byte."""
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        REQUEST_SECONDS.observe(time.perf_counter() - started, route=route,
+                                method=request.method, status=response.status_code)
+    return response
+
+@app.route('/metrics')
+def get_metrics():
+    """All metrics, summed over every worker when METRICS_DIR is set."""
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+PLANT_TYPES = {'steel': 'Steel Iron Plant', 'sponge': 'Sponge Iron Plant'}
+PLANT_QUERY_ARGS = ('state', 'type', 'bbox', 'fields', 'limit', 'after', 'format')
+
+def build_plant_records(steel_plants, sponge_plants, plant_table):
+    """Every workbook column of every plant plus its plant-table fields, in table order."""
+    raw = [plant for plants_by_state in (steel_plants, sponge_plants)
+           for plants in plants_by_state.values() for plant in plants]
+    return [{**plant, **row} for plant, row in zip(raw, plant_table)]
+
+datasets.register_derived('plant_records', ['steel_plants', 'sponge_plants', 'plant_table'],
+                          build_plant_records, default=[])
+datasets.register_derived('plant_positions', ['plant_table'],
+                          lambda table: {p['id']: i for i, p in enumerate(table)}, default={})
+datasets.register_derived('plant_search', ['plant_table'], PlantSearchIndex,
+                          default=PlantSearchIndex([]))
+
+# /api/search: results per request by default and at most; longer queries are cut.
+SEARCH_LIMIT = 10
+SEARCH_MAX_LIMIT = 50
+SEARCH_MAX_QUERY = 100
+SEARCH_FIELDS = ('id', 'name', 'city', 'state', 'district', 'type', 'lat', 'lon')
+
+def _plant_types(value):
+    """Parse a comma-separated steel/sponge list into plant types; None means all."""
+    if not value:
+        return None
+    types = set()
+    for item in value.split(','):
+        item = item.strip()
+        plant_type = PLANT_TYPES.get(item.lower(), item)
+        if plant_type not in PLANT_TYPES.values():
+            raise ValueError(f"type must be one of {', '.join(PLANT_TYPES)}")
+        types.add(plant_type)
+    return types
+
+def _plant_query():
+    """Parse the /api/plants filters; raises ValueError on bad input."""
+    state = request.args.get('state')
+    types = _plant_types(request.args.get('type'))
+    bbox = None
+    if request.args.get('bbox'):
+        try:
+            bbox = [float(v) for v in request.args['bbox'].split(',')]
+        except ValueError:
+            bbox = []
+        if len(bbox) != 4:
+            raise ValueError('bbox must be west,south,east,north')
+    fields = None
+    if request.args.get('fields'):
+        fields = ['id'] + [f.strip() for f in request.args['fields'].split(',') if f.strip() and f.strip() != 'id']
+    limit = request.args.get('limit')
+    if limit is not None:
+        if not limit.isdigit() or int(limit) < 1:
+            raise ValueError('limit must be a positive integer')
+        limit = int(limit)
+    start = 0
+    after = request.args.get('after')
+    if after:
+        position = datasets.get('plant_positions').get(after)
+        if position is None:
+            raise ValueError(f'Unknown plant id in after: {after}')
+        start = position + 1
+    return state, types, bbox, fields, limit, start
+
+def iter_plants(records, start, state=None, types=None, bbox=None, fields=None):
+    """Yield the matching plant records from ``start`` on, projected to ``fields``."""
+    skey = state_key(state) if state else None
+    for record in itertools.islice(records, start, None):
+        if skey is not None and state_key(record['state']) != skey:
+            continue
+        if types is not None and record['type'] not in types:
+            continue
+        if bbox is not None:
+            lat, lon = record['lat'], record['lon']
+            if lat is None or not (bbox[0] <= lon <= bbox[2] and bbox[1] <= lat <= bbox[3]):
+                continue
+        yield record if fields is None else {f: record[f] for f in fields if f in record}
+
 @app.route('/api/plants')
 def get_plants():
+    """All plants grouped by type and state, or a filtered, paginated listing.
+
+    With any of ``state``, ``type`` (steel/sponge), ``bbox``
+    (west,south,east,north), ``fields``, ``limit`` or ``after`` (the last
+    id already received) it returns ``{"plants": [...], "next": id}``;
+    ``format=ndjson`` or ``Accept: application/x-ndjson`` streams one plant
+    per line instead. Both are written from a generator as they are matched.
+    """
+    ndjson = (request.args.get('format') == 'ndjson' or request.accept_mimetypes.best_match(
+        ['application/json', 'application/x-ndjson']) == 'application/x-ndjson')
     try:
-        steel_plants = load_steel_plant_data()
-        sponge_plants = load_sponge_plant_data()
-        return jsonify({
-            'steel': steel_plants,
-            'sponge': sponge_plants
-        })
+        if not ndjson and not any(arg in request.args for arg in PLANT_QUERY_ARGS):
+            return datasets.get('plants_payload').response()
+        state, types, bbox, fields, limit, start = _plant_query()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+    records = datasets.get('plant_records')
+    matches = iter_plants(records, start, state, types, bbox, fields)
+    default = app.json.default
+
+    if ndjson:
+        def generate_ndjson():
+            for record in itertools.islice(matches, limit):
+                yield dumps(record, default) + b'\n'
+        return Response(generate_ndjson(), mimetype='application/x-ndjson')
+
+    def generate():
+        yield b'{"plants":['
+        last = None
+        for n, record in enumerate(itertools.islice(matches, limit)):
+            yield dumps(record, default) if n == 0 else b',' + dumps(record, default)
+            last = record['id']
+        more = limit is not None and last is not None and next(matches, None) is not None
+        yield b'],"next":' + dumps(last if more else None) + b'}'
+    return Response(generate(), mimetype='application/json')
+
 @app.route('/api/biomass/all')
 def get_all_biomass():
     try:
-        biomass_data = load_all_biomass_data()
-        if biomass_data:
-            return jsonify(biomass_data), 200
+        payload = datasets.get('all_biomass_payload')
+        if payload is not None:
+            return payload.response()
         else:
             return jsonify({'error': 'No biomass data found'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/biomass/summary')
+@view_cache.view(dataset_version('biomass_cube'))
+def get_biomass_summary():
+    """Choropleth totals: ?level=state|district&metric=&crops=a,b[&state=]."""
+    try:
+        cube = datasets.get('biomass_cube')
+        level = request.args.get('level', 'state')
+        metric = request.args.get('metric', 'surplus_biomass')
+        crops = request.args.get('crops')
+        state = request.args.get('state')
+        if level not in ('state', 'district'):
+            return jsonify({'error': 'level must be state or district'}), 400
+        if metric not in cube.metrics:
+            return jsonify({'error': f"metric must be one of {', '.join(cube.metrics)}"}), 400
+        if crops:
+            crops = [c.strip() for c in crops.split(',') if c.strip()]
+            unknown = [c for c in crops if c not in cube.crops]
+            if unknown:
+                return jsonify({'error': f"Unknown crops: {', '.join(unknown)}"}), 400
+        else:
+            crops = cube.crops
+        values = cube.summary(level, metric, crops, state)
+        if state is not None and not values:
+            return jsonify({'error': f'No biomass data found for {state}'}), 404
+        flat = list(values.values()) if level == 'state' else [v for d in values.values() for v in d.values()]
+        return jsonify({
+            'level': level,
+            'metric': metric,
+            'crops': crops,
+            'min': min(flat, default=None),
+            'max': max(flat, default=None),
+            'values': values,
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/allocation', methods=['GET', 'POST'])
+def get_allocation():
+    """Assign district surplus biomass to plants within a transport radius.
+
+    Parameters come from the query string or a JSON body: ``radius_km``,
+    ``crops``, ``state`` (supplying districts), ``type`` (receiving
+    plants), ``circuity`` and ``demand_kt`` per plant; the body may also
+    carry ``demand``, a ``{plant_id: kt}`` map of per-plant overrides.
+    """
+    try:
+        body = request.get_json(silent=True) or {}
+        if not isinstance(body, dict):
+            raise ValueError('Request body must be a JSON object')
+        params = {**request.args.to_dict(), **body}
+        radius_km = float(params.get('radius_km', ALLOCATION_RADIUS_KM))
+        circuity = float(params.get('circuity', ROAD_CIRCUITY_FACTOR))
+        default_demand = float(params.get('demand_kt', ALLOCATION_PLANT_DEMAND_KT))
+        if not 0 < radius_km <= ALLOCATION_MAX_RADIUS_KM:
+            raise ValueError(f'radius_km must be in (0, {ALLOCATION_MAX_RADIUS_KM:g}]')
+        if not (math.isfinite(circuity) and circuity > 0
+                and math.isfinite(default_demand) and default_demand >= 0):
+            raise ValueError('circuity must be positive and demand_kt non-negative')
+        overrides = params.get('demand') or {}
+        if not isinstance(overrides, dict):
+            raise ValueError('demand must be an object of plant id -> kt')
+        overrides = {plant_id: float(amount) for plant_id, amount in overrides.items()}
+        if not all(math.isfinite(amount) and amount >= 0 for amount in overrides.values()):
+            raise ValueError('demand amounts must be non-negative numbers')
+        crops = params.get('crops')
+        if isinstance(crops, str):
+            crops = [c.strip() for c in crops.split(',') if c.strip()]
+        elif crops is not None and not (isinstance(crops, list)
+                                        and all(isinstance(c, str) for c in crops)):
+            raise ValueError('crops must be a comma-separated string or a list of crop names')
+        plant_type = params.get('type')
+        if plant_type is not None and not isinstance(plant_type, str):
+            raise ValueError('type must be a comma-separated string')
+        types = _plant_types(plant_type)
+        state = params.get('state')
+        if state is not None and not isinstance(state, str):
+            raise ValueError('state must be a string')
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        cube = datasets.get('biomass_cube')
+        polygons = datasets.get('district_polygons')
+        index = datasets.get('plant_spatial_index')
+        if crops and any(c not in cube.crops for c in crops):
+            return jsonify({'error': f"crops must be among {', '.join(cube.crops)}"}), 400
+        if polygons is None:
+            return jsonify({'error': 'No district boundaries found'}), 404
+
+        # Supply: surplus biomass at the centroid of every district with a polygon.
+        totals = cube.totals('surplus_biomass', crops or None)
+        centroids = polygons.centroids()
+        skey = state_key(state) if state else None
+        sources, supply = [], []
+        unmapped = 0.0
+        for s, state_name in enumerate(cube.states):
+            if skey is not None and state_key(state_name) != skey:
+                continue
+            for d, district in enumerate(cube.districts[s]):
+                amount = float(totals[s, d])
+                if amount <= 0:
+                    continue
+                number = polygons.find(state_name, district)
+                if number is None or np.isnan(centroids[number, 0]):
+                    unmapped += amount
+                    continue
+                sources.append((state_name, district, number))
+                supply.append(amount)
+        supply = np.array(supply)
+
+        # Demand: every plant of the requested types, with per-plant overrides.
+        plants = index.plants
+        demand = np.array([default_demand if types is None or p['type'] in types else 0.0
+                           for p in plants])
+        positions = {p['id']: i for i, p in enumerate(plants)}
+        for plant_id, amount in overrides.items():
+            if plant_id not in positions:
+                return jsonify({'error': f'Unknown or unlocated plant id in demand: {plant_id}'}), 400
+            demand[positions[plant_id]] = amount
+
+        numbers = [number for _, _, number in sources]
+        origins, targets, km = allocation.candidate_routes(
+            index, centroids[numbers, 0], centroids[numbers, 1], radius_km, circuity)
+        routed = demand[targets] > 0
+        origins, targets, km = origins[routed], targets[routed], km[routed]
+        amounts = allocation.greedy_allocate(supply, demand, origins, targets, km)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    used = np.flatnonzero(amounts > 0)
+    used = used[np.lexsort((km[used], origins[used]))]
+    allocations = []
+    for k in used.tolist():
+        state_name, district, number = sources[origins[k]]
+        plant = plants[targets[k]]
+        allocations.append({
+            'state': state_name,
+            'district': district,
+            'dt_code': polygons.codes[number],
+            'plant_id': plant['id'],
+            'plant': plant['name'],
+            'distance_km': round(float(km[k]), 3),
+            'amount_kt': round(float(amounts[k]), 3),
+        })
+    received = np.bincount(targets, weights=amounts, minlength=len(plants))
+    allocated = float(amounts.sum())
+    return jsonify({
+        'radius_km': radius_km,
+        'circuity': circuity,
+        'crops': crops or cube.crops,
+        'totals': {
+            'supply_kt': round(float(supply.sum()), 3),
+            'demand_kt': round(float(demand.sum()), 3),
+            'allocated_kt': round(allocated, 3),
+            'unallocated_supply_kt': round(float(supply.sum()) - allocated, 3),
+            'unmapped_supply_kt': round(unmapped, 3),
+            'kt_km': round(float((amounts * km).sum()), 3),
+            'candidate_routes': int(len(km)),
+        },
+        'allocations': allocations,
+        'plants': [{'id': plants[j]['id'], 'name': plants[j]['name'], 'state': plants[j]['state'],
+                    'demand_kt': round(float(demand[j]), 3), 'allocated_kt': round(float(received[j]), 3)}
+                   for j in np.flatnonzero(received > 0).tolist()],
+    }), 200
+
 @app.route('/api/biomass/state/<state>')
+@view_cache.view(biomass_state_version)
 def get_state_biomass(state):
     try:
-        biomass_data = load_all_biomass_data()
+        biomass_data = datasets.get('all_biomass')
         state_data = biomass_data.get(state, [])
         if state_data:
             return jsonify(state_data), 200
@@ -627,28 +713,20 @@ def get_state_biomass(state):
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/districts/<state>/<district>')
+@view_cache.view(dataset_version('district_index'))
 def get_district_details(state, district):
     try:
-        plants_data = load_plant_data()
-        biomass_data = load_all_biomass_data()
-        
         district = district.strip().lower()
         state = state.strip()
         
-        # Get plant details for the state
-        plants_in_district = []
-        if state in plants_data:
-            plants_in_district = [plant for plant in plants_data[state] if plant.get("City/ District", "").lower() == district]
-        
-        # Get biomass details for the state
-        biomass_in_district = None
-        if state in biomass_data:
-            biomass_in_district = next((b for b in biomass_data[state] if b["district"].lower() == district), None)
+        index = datasets.get('district_index')
+        plants_in_district, biomass_in_district = index.lookup(state, district)
         
         # Combine data
         response = {
             "district": district.title(),
             "state": state,
+            "dt_code": index.code(state, district),
             "plants": plants_in_district,
             "biomass": biomass_in_district
         }
@@ -657,22 +735,18 @@ def get_district_details(state, district):
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/odisha/districts/<district>')
+@view_cache.view(dataset_version('district_index'))
 def get_odisha_district_details(district):
     try:
-        plants_data = load_plant_data()
-        biomass_data = load_odisha_biomass_data()
-        
         district = district.strip().lower()
         
-        # Get plant details
-        plants_in_district = [plant for plant in plants_data.get("Odisha", []) if plant.get("City/ District", "").lower() == district]
-        
-        # Get biomass details
-        biomass_in_district = next((b for b in biomass_data if b["district"].lower() == district), None)
+        index = datasets.get('district_index')
+        plants_in_district, biomass_in_district = index.lookup('Odisha', district)
         
         # Combine data
         response = {
             "district": district.title(),
+            "dt_code": index.code('Odisha', district),
             "plants": plants_in_district,
             "biomass": biomass_in_district
         }
@@ -682,10 +756,79 @@ def get_odisha_district_details(district):
 
 
 
+def _float_arg(name, default=None):
+    value = request.args.get(name, default)
+    if value is None or value == '':
+        raise ValueError(f'{name} parameter is missing')
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f'Invalid {name}: {value}')
+
+def _point_args():
+    lat = _float_arg('lat')
+    lon = _float_arg('lon')
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError(f'Point out of range: {lat}, {lon}')
+    return lat, lon
+
+@app.route('/api/plants/nearest')
+def get_nearest_plants():
+    """Return the k plants closest to a point, nearest first."""
+    try:
+        lat, lon = _point_args()
+        k = _float_arg('k', 10)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not (np.isfinite(k) and k >= 0 and k == int(k)):
+        return jsonify({'error': 'k must be a non-negative integer'}), 400
+    try:
+        plants = datasets.get('plant_spatial_index').nearest(lat, lon, int(k))
+        return jsonify({'plants': plants}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/plants/within')
+def get_plants_within():
+    """Return every plant within radius_km of a point, nearest first."""
+    try:
+        lat, lon = _point_args()
+        radius_km = _float_arg('radius_km')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not radius_km >= 0:
+        return jsonify({'error': 'radius_km must be a non-negative number'}), 400
+    try:
+        plants = datasets.get('plant_spatial_index').within(lat, lon, radius_km)
+        return jsonify({'plants': plants}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/search')
+def search_plants():
+    """Typo-tolerant plant search over name, city and state: ?q=&limit=."""
+    query = request.args.get('q', '')[:SEARCH_MAX_QUERY]
+    if not query.strip():
+        return jsonify({'error': 'q parameter is missing'}), 400
+    try:
+        limit = _float_arg('limit', SEARCH_LIMIT)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not (math.isfinite(limit) and limit >= 1 and limit == int(limit)):
+        return jsonify({'error': 'limit must be a positive integer'}), 400
+    limit = min(int(limit), SEARCH_MAX_LIMIT)
+    try:
+        results = datasets.get('plant_search').search(query, limit)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    return jsonify({'query': query, 'results': [
+        dict({f: plant.get(f) for f in SEARCH_FIELDS}, score=score) for plant, score in results]}), 200
+
 @app.route('/api/plants/<state>')
+@view_cache.view(dataset_version('steel_plants'))
 def get_plants_by_state(state):
     try:
-        plants_by_state = load_plant_data()
+        plants_by_state = datasets.get('steel_plants')
         state = str(state).strip()
         if state in plants_by_state:
             return jsonify(plants_by_state[state])
@@ -695,6 +838,7 @@ def get_plants_by_state(state):
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/biomass', methods=['GET'])
+@view_cache.view(dataset_version('biomass'))
 def get_biomass():
     """API endpoint to return biomass data for a specific state."""
     try:
@@ -702,7 +846,7 @@ def get_biomass():
         if not state:
             return jsonify({'error': 'State parameter is missing'}), 400
 
-        biomass_data = load_biomass_data()
+        biomass_data = datasets.get('biomass')
         
         # Combine data from all sheets for the given state
         state_data = []
@@ -716,6 +860,56 @@ def get_biomass():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def osrm_distance_km(lat1, lon1, lat2, lon2):
+    """Driving distance from the configured OSRM server, or None."""
+    url = f"{OSRM_URL}/route/v1/driving/{lon1},{lat1};{lon2},{lat2}?overview=false"
+    response = get_session().get(url, timeout=UPSTREAM_TIMEOUT)
+    response.raise_for_status()
+    data = response.json()
+    if data['code'] == 'Ok':
+        return data['routes'][0]['distance'] / 1000
+    return None
+
+def route_distance_km(lat1, lon1, lat2, lon2):
+    """Driving distance using the local road graph, then OSRM if configured.
+
+    Returns ``(distance_km, estimated)``. While OSRM is failing the
+    distance is a haversine estimate scaled by ROAD_CIRCUITY_FACTOR and
+    ``estimated`` is True; estimates are never cached. Cached distances
+    belong to one version of the road graph; after it is rebuilt, the old
+    entries are never read again and age out of the LRU.
+    """
+    key = (datasets.version('road_graph'),
+           *(round(v, ROUTE_CACHE_PRECISION) for v in (lat1, lon1, lat2, lon2)))
+    distance_km = route_cache.get(key)
+    if distance_km is not None:
+        return distance_km, False
+    graph = datasets.get('road_graph')
+    if graph is not None:
+        distance_km = graph.distance_km(lat1, lon1, lat2, lon2)
+    if distance_km is None and OSRM_URL:
+        if not osrm_breaker.allow():
+            return ROAD_CIRCUITY_FACTOR * float(haversine_km(lat1, lon1, lat2, lon2)), True
+        start = time.perf_counter()
+        try:
+            distance_km = osrm_distance_km(lat1, lon1, lat2, lon2)
+        except Exception as e:
+            # Any failure, including a malformed reply, must end the half-open
+            # trial; otherwise the breaker would never let another call through.
+            osrm_latency.record(time.perf_counter() - start, ok=False)
+            UPSTREAM_SECONDS.observe(time.perf_counter() - start, service='osrm', outcome='error')
+            osrm_breaker.record_failure()
+            if not isinstance(e, requests.RequestException):
+                raise
+            print(f"OSRM request failed: {str(e)}")
+            return ROAD_CIRCUITY_FACTOR * float(haversine_km(lat1, lon1, lat2, lon2)), True
+        osrm_latency.record(time.perf_counter() - start)
+        UPSTREAM_SECONDS.observe(time.perf_counter() - start, service='osrm', outcome='ok')
+        osrm_breaker.record_success()
+    if distance_km is not None:
+        route_cache.set(key, distance_km)
+    return distance_km, False
+
 @app.route('/api/distance')
 def get_distance():
     try:
@@ -723,50 +917,330 @@ def get_distance():
         lon1 = request.args.get('lon1')
         lat2 = request.args.get('lat2')
         lon2 = request.args.get('lon2')
-        print('Received:', lat1, lon1, lat2, lon2)
-        if all([lat1, lon1, lat2, lon2]):
-            try:
-                lat1 = float(lat1)
-                lon1 = float(lon1)
-                lat2 = float(lat2)
-                lon2 = float(lon2)
-            except Exception as e:
-                return jsonify({'error': f'Invalid coordinates: {e}'}), 400
-            url = f"http://router.project-osrm.org/route/v1/driving/{lon1},{lat1};{lon2},{lat2}?overview=false"
-            response = requests.get(url)
-            response.raise_for_status()
-            data = response.json()
-            if data['code'] == 'Ok':
-                distance_meters = data['routes'][0]['distance']
-                distance_km = distance_meters / 1000
-                return jsonify({'distance': f"{distance_km:.2f} km"})
-            else:
-                return jsonify({'error': 'Could not calculate distance using OSRM'}), 500
-        # Fallback: use city geocoding if lat/lon not provided
-        origin_city = request.args.get('origin')
-        destination_city = request.args.get('destination')
-        if not origin_city or not destination_city:
-            return jsonify({'error': 'Origin and destination cities or coordinates are required'}), 400
-        lat1, lon1 = get_coords(origin_city)
-        lat2, lon2 = get_coords(destination_city)
-        if not lat1 or not lon1 or not lat2 or not lon2:
-            return jsonify({'error': 'Could not geocode one or both cities'}), 400
-        url = f"http://router.project-osrm.org/route/v1/driving/{lon1},{lat1};{lon2},{lat2}?overview=false"
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
-        if data['code'] == 'Ok':
-            distance_meters = data['routes'][0]['distance']
-            distance_km = distance_meters / 1000
-            return jsonify({'distance': f"{distance_km:.2f} km"})
-        else:
-            return jsonify({'error': 'Could not calculate distance using OSRM'}), 500
+        if not all([lat1, lon1, lat2, lon2]):
+            # Fallback: use city geocoding if lat/lon not provided
+            origin_city = request.args.get('origin')
+            destination_city = request.args.get('destination')
+            if not origin_city or not destination_city:
+                return jsonify({'error': 'Origin and destination cities or coordinates are required'}), 400
+            lat1, lon1 = get_coords(origin_city)
+            lat2, lon2 = get_coords(destination_city)
+            if not lat1 or not lon1 or not lat2 or not lon2:
+                return jsonify({'error': 'Could not geocode one or both cities'}), 400
+        try:
+            lat1 = float(lat1)
+            lon1 = float(lon1)
+            lat2 = float(lat2)
+            lon2 = float(lon2)
+        except Exception as e:
+            return jsonify({'error': f'Invalid coordinates: {e}'}), 400
+        distance_km, estimated = route_distance_km(lat1, lon1, lat2, lon2)
+        if distance_km is None:
+            return jsonify({'error': 'Could not calculate a driving distance between these points'}), 500
+        if estimated:
+            return jsonify({'distance': f"{distance_km:.2f} km", 'estimated': True})
+        return jsonify({'distance': f"{distance_km:.2f} km"})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/distance/stats')
+def get_distance_stats():
+    """Route cache hit ratio and OSRM latency for this worker process."""
+    return jsonify({
+        'route_cache': route_cache.stats(),
+        'osrm': dict(osrm_latency.stats(), breaker=osrm_breaker.state),
+    })
+
+@app.route('/api/cache/stats')
+def get_cache_stats():
+    """Response cache backend and this worker's hit ratio (all workers: /metrics)."""
+    return jsonify(dict(view_cache.stats(), backend=app.config['CACHE_TYPE']))
+
+def _resolve_points(items, name):
+    """Turn a list of [lat, lon], {lat, lon} or plant ids into (lat, lon) pairs."""
+    if not isinstance(items, list) or not items:
+        raise ValueError(f'{name} must be a non-empty list')
+    plants_by_id = datasets.get('plants_by_id')
+    points = []
+    for item in items:
+        if isinstance(item, str):
+            plant = plants_by_id.get(item)
+            if plant is None:
+                raise ValueError(f'Unknown plant id in {name}: {item}')
+            if plant['lat'] is None or plant['lon'] is None:
+                raise ValueError(f'Plant {item} has no coordinates')
+            points.append((plant['lat'], plant['lon']))
+            continue
+        if isinstance(item, dict):
+            item = [item.get('lat'), item.get('lon')]
+        try:
+            lat, lon = (float(v) for v in item)
+        except (TypeError, ValueError):
+            raise ValueError(f'Invalid point in {name}: {item!r}')
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            raise ValueError(f'Point out of range in {name}: {item!r}')
+        points.append((lat, lon))
+    return points
+
+@app.route('/api/distance/matrix', methods=['POST'])
+def get_distance_matrix():
+    """Great-circle distance matrix between lists of coordinates or plant ids.
+
+    The body is ``{"origins": [...], "destinations": [...], "circuity": 1.3}``;
+    ``circuity`` defaults to ROAD_CIRCUITY_FACTOR. The matrix is streamed in
+    row blocks so large requests start responding immediately.
+    """
+    body = request.get_json(silent=True) or {}
+    if not isinstance(body, dict):
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
+    try:
+        origins = _resolve_points(body.get('origins'), 'origins')
+        destinations = _resolve_points(body.get('destinations'), 'destinations')
+        circuity = float(body.get('circuity', ROAD_CIRCUITY_FACTOR))
+        if not (np.isfinite(circuity) and circuity > 0):
+            raise ValueError('circuity must be a positive number')
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    if len(origins) * len(destinations) > DISTANCE_MATRIX_MAX_CELLS:
+        return jsonify({'error': f'At most {DISTANCE_MATRIX_MAX_CELLS} origin x destination '
+                                 'pairs per request'}), 400
+
+    def generate():
+        yield dumps({'origins': len(origins), 'destinations': len(destinations),
+                     'circuity': circuity, 'unit': 'km'})[:-1]
+        yield b',"distances":['
+        first = True
+        for block in distance_matrix_blocks(origins, destinations, circuity):
+            rows = dumps(block.round(3))[1:-1]
+            yield rows if first else b',' + rows
+            first = False
+        yield b']}'
+
+    return Response(generate(), mimetype='application/json')
+
+@app.route('/api/distance/batch', methods=['POST'])
+def get_distance_batch():
+    """Driving distances for many pairs, resolved concurrently.
+
+    The body is ``{"pairs": [[origin, destination], ...]}`` where each point
+    is [lat, lon], {lat, lon} or a plant id. Results come back in request
+    order; identical pairs are routed once.
+    """
+    body = request.get_json(silent=True) or {}
+    if not isinstance(body, dict):
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
+    pairs = body.get('pairs')
+    if not isinstance(pairs, list) or not pairs:
+        return jsonify({'error': 'pairs must be a non-empty list'}), 400
+    if len(pairs) > DISTANCE_BATCH_MAX_PAIRS:
+        return jsonify({'error': f'At most {DISTANCE_BATCH_MAX_PAIRS} pairs per request'}), 400
+    try:
+        if not all(isinstance(pair, list) and len(pair) == 2 for pair in pairs):
+            raise ValueError('each pair must be [origin, destination]')
+        origins = _resolve_points([pair[0] for pair in pairs], 'origins')
+        destinations = _resolve_points([pair[1] for pair in pairs], 'destinations')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    def resolve(points):
+        try:
+            distance_km, estimated = route_distance_km(*points)
+        except Exception as e:
+            return {'error': str(e)}
+        if distance_km is None:
+            return {'error': 'Could not calculate a driving distance between these points'}
+        result = {'distance': f"{distance_km:.2f} km", 'distance_km': round(distance_km, 3)}
+        if estimated:
+            result['estimated'] = True
+        return result
+
+    unique = list(dict.fromkeys(o + d for o, d in zip(origins, destinations)))
+    resolved = dict(zip(unique, get_executor().map(resolve, unique)))
+    return jsonify({'results': [resolved[o + d] for o, d in zip(origins, destinations)]})
+
 @app.route('/static/geojson/<path:filename>')
 def serve_geojson(filename):
-    return send_from_directory('static/geojson', filename)
+    """Serve a boundary file, simplified when ?detail=, ?zoom= or ?format= is given.
+
+    ``detail`` is one of low/medium/high/full, ``zoom`` a web-map zoom level
+    and ``format`` geojson (default) or topojson. Without any of them the
+    original file is sent unchanged.
+    """
+    detail = request.args.get('detail')
+    zoom = request.args.get('zoom')
+    fmt = request.args.get('format')
+    if detail is None and zoom is None and fmt is None:
+        return send_from_directory('static/geojson', filename)
+    if detail is None:
+        try:
+            zoom_level = float(zoom) if zoom is not None else None
+            if zoom_level is not None and not math.isfinite(zoom_level):
+                raise ValueError(zoom)
+        except ValueError:
+            return jsonify({'error': f'Invalid zoom: {zoom}'}), 400
+        detail = detail_for_zoom(zoom_level) if zoom_level is not None else 'full'
+    if detail not in DETAIL_TOLERANCES:
+        return jsonify({'error': f"detail must be one of {', '.join(DETAIL_TOLERANCES)}"}), 400
+    fmt = fmt or 'geojson'
+    if fmt not in FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(FORMATS)}"}), 400
+    try:
+        payload = geometry_store.get(filename, detail, fmt)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    if payload is None:
+        return jsonify({'error': f'No such geometry file: {filename}'}), 404
+    return payload.response()
+
+def build_tileset(district_index):
+    """States layer from india.json, districts layer (with biomass totals) from the state files."""
+    def biomass_attributes(properties):
+        _, record = district_index.lookup(properties.get('st_nm', ''), properties.get('district', ''))
+        if record is None:
+            return {}
+        totals = {}
+        for metric in biomass.METRICS:
+            total = sum(v for v in record[metric].values() if v is not None)
+            totals[metric] = round(float(total), 2)
+        return totals
+
+    states = [geometry_store.topology('india.json')]
+    districts = [geometry_store.topology(f) for f in sorted(geometry_store.files())
+                 if f.startswith('states' + os.sep)]
+    return tiles.TileSet([
+        tiles.TileLayer('states', [t for t in states if t is not None]),
+        tiles.TileLayer('districts', districts, min_zoom=DISTRICT_TILE_MIN_ZOOM,
+                        attributes=biomass_attributes),
+    ], max_zoom=TILE_MAX_ZOOM)
+
+datasets.register_derived('tileset', ['district_index'], build_tileset)
+
+@app.route('/tiles/<int:z>/<int:x>/<int:y>.mvt')
+def get_tile(z, x, y):
+    """Vector tile with a ``states`` and (from DISTRICT_TILE_MIN_ZOOM) a ``districts`` layer."""
+    try:
+        tileset = datasets.get('tileset')
+        if tileset is None:
+            return jsonify({'error': 'No boundary data found'}), 404
+        if not tileset.valid(z, x, y):
+            return jsonify({'error': f'No such tile: {z}/{x}/{y}'}), 404
+        path = tileset.cached_tile(TILE_CACHE_DIR, z, x, y)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    return send_file(path, mimetype=tiles.MIMETYPE, conditional=True, max_age=TILE_MAX_AGE)
+
+def warm():
+    """Build every dataset, index and the boundary responses the map requests.
+
+    Run once before serving; under gunicorn (see gunicorn.conf.py) it runs
+    in the master so the workers share the result instead of each
+    building their own.
+    """
+    datasets.load_all()
+    # The variants static/js/main.js fetches.
+    geometry_store.get('india.json', 'medium', 'geojson')
+    for filename in geometry_store.files():
+        if filename.startswith('states' + os.sep):
+            geometry_store.get(filename, 'high', 'geojson')
+
+@app.cli.command('build-snapshot')
+def build_snapshot_command():
+    """Compile the xlsx sources into a binary snapshot for fast startup."""
+    target, count = snapshot.build(DATA_DIR)
+    print(f"Wrote {count} sources to {target}")
+    xlsx_seconds, snapshot_seconds = snapshot.compare_load_times(DATA_DIR)
+    print(f"Full load from xlsx: {xlsx_seconds * 1000:.1f} ms")
+    print(f"Full load from snapshot: {snapshot_seconds * 1000:.1f} ms "
+          f"({xlsx_seconds / snapshot_seconds:.0f}x faster)")
+
+@app.cli.command('ingest')
+@click.option('--snapshot', 'write_snapshot', is_flag=True,
+              help='Also compile the validated workbooks into the snapshot.')
+def ingest_command(write_snapshot):
+    """Validate every workbook and build every dataset and index once."""
+    for name in sorted(os.listdir(DATA_DIR)):
+        if is_temporary(name) and name.endswith(('.xlsx', '.xls')):
+            print(f"Ignoring {name}")
+    started = time.perf_counter()
+    datasets.load_all()
+    failed = 0
+    for name, status in datasets.status().items():
+        if status['error'] is not None:
+            failed += 1
+            print(f"{name:<20} FAILED  {status['error']}")
+        elif status['seconds'] is not None:
+            print(f"{name:<20} ok {status['seconds'] * 1000:9.1f} ms")
+    print(f"Built {len(datasets.names()) - failed} of {len(datasets.names())} datasets "
+          f"in {time.perf_counter() - started:.1f}s")
+    if failed:
+        raise SystemExit(1)
+    if write_snapshot:
+        target, count = snapshot.build(DATA_DIR)
+        print(f"Wrote {count} sources to {target}")
+
+@app.cli.command('build-road-graph')
+@click.argument('nodes_csv')
+@click.argument('edges_csv')
+def build_road_graph_command(nodes_csv, edges_csv):
+    """Compile node/edge CSVs of a road network into ROAD_GRAPH_FILE."""
+    output = os.path.join(DATA_DIR, ROAD_GRAPH_FILE)
+    nodes, edges = routing.build(nodes_csv, edges_csv, output)
+    print(f"Wrote {nodes} nodes and {edges} directed edges to {output}")
+
+@app.cli.command('geocode-plants')
+def geocode_plants_command():
+    """Pre-geocode every City/ District in the plant workbooks."""
+    cities = set()
+    for name in ('steel_plants', 'sponge_plants'):
+        for plants in datasets.get(name).values():
+            cities.update(str(p.get('City/ District', '')).strip() for p in plants)
+    cities.discard('')
+    geocoder = get_geocoder()
+    missing = 0
+    for n, city in enumerate(sorted(cities), 1):
+        try:
+            lat, lon = geocoder.lookup(city)
+        except Exception as e:
+            print(f"Error geocoding {city}: {str(e)}")
+            continue
+        if lat is None:
+            missing += 1
+        if n % 50 == 0:
+            print(f"{n}/{len(cities)} cities")
+    print(f"Geocoded {len(cities) - missing} of {len(cities)} cities; {len(geocoder.cache)} cached entries")
+
+@app.cli.command('build-geometry')
+def build_geometry_command():
+    """Build every simplified boundary variant and report its size."""
+    for filename in geometry_store.files():
+        raw = os.path.getsize(geometry_store.path(filename))
+        sizes = []
+        for detail in DETAIL_TOLERANCES:
+            for fmt in FORMATS:
+                payload = geometry_store.get(filename, detail, fmt)
+                sizes.append(f"{detail}/{fmt} {len(payload.variants['gzip'][0]) // 1024}K")
+        print(f"{filename} ({raw // 1024}K raw): gzip " + ', '.join(sizes))
+
+@app.cli.command('seed-tiles')
+@click.option('--min-zoom', default=0, show_default=True)
+@click.option('--max-zoom', default=8, show_default=True)
+def seed_tiles_command(min_zoom, max_zoom):
+    """Render every tile covering India for a range of zoom levels into TILE_CACHE_DIR."""
+    tileset = datasets.get('tileset')
+    if tileset is None:
+        print("No boundary data found")
+        return
+    bounds = tileset.bounds()
+    for zoom in range(min_zoom, min(max_zoom, tileset.max_zoom) + 1):
+        started = time.perf_counter()
+        x0, y0, x1, y1 = tiles.tile_range(zoom, *bounds)
+        count = size = 0
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                size += os.path.getsize(tileset.cached_tile(TILE_CACHE_DIR, zoom, x, y))
+                count += 1
+        print(f"z{zoom}: {count} tiles, {size // 1024}K in {time.perf_counter() - started:.1f}s")
+    print(f"Tiles written to {os.path.join(TILE_CACHE_DIR, tileset.version)}")
 
 # if __name__ == '__main__':
 #     port = int(os.environ.get("PORT", 10000))  # Default to port 5000 if PORT is not set
@@ -775,4 +1249,5 @@ def serve_geojson(filename):
 PORT = int(os.environ.get("PORT", 10000))  # Use Render's assigned port
 
 if __name__ == "__main__":
+    warm()
     app.run(host="0.0.0.0", port=PORT, debug=True)
\ No newline at end of file
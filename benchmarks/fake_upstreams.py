@@ -0,0 +1,62 @@
+"""Local stand-ins for OSRM and Nominatim.
+
+One threaded HTTP server answers both APIs after a fixed artificial
+latency, so distance and geocoding benchmarks measure this app rather
+than the public servers (and never hit their rate limits):
+
+* ``/route/v1/driving/<lon>,<lat>;<lon>,<lat>`` -- great-circle distance x 1.3
+* ``/search?q=`` -- a stable point inside India derived from the query
+"""
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from geo import haversine_km
+
+CIRCUITY = 1.3
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real services
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        url = urlsplit(self.path)
+        if url.path.startswith('/route/v1/driving/'):
+            try:
+                (lon1, lat1), (lon2, lat2) = (map(float, p.split(','))
+                                              for p in url.path.rsplit('/', 1)[1].split(';'))
+            except ValueError:
+                return self._send(400, {'code': 'InvalidQuery'})
+            metres = float(haversine_km(lat1, lon1, lat2, lon2)) * 1000 * CIRCUITY
+            return self._send(200, {'code': 'Ok', 'routes': [{'distance': metres, 'duration': metres / 15}]})
+        if url.path == '/search':
+            query = parse_qs(url.query).get('q', [''])[0]
+            digest = hashlib.sha256(query.encode()).digest()
+            lat = 8 + 28 * digest[0] / 255
+            lon = 69 + 28 * digest[1] / 255
+            return self._send(200, [{'lat': f'{lat:.6f}', 'lon': f'{lon:.6f}'}])
+        self._send(404, {'error': 'not found'})
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start(latency=0.02, host='127.0.0.1', port=0):
+    """Serve both fakes from a daemon thread; returns ``(server, base_url)``."""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.latency = latency
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://{host}:{server.server_address[1]}'
@@ -0,0 +1,276 @@
+"""Endpoint benchmarks against synthetic data and fake upstreams.
+
+Run from the repository root::
+
+    python -m benchmarks.run --scales 1,10 --modes inprocess,gunicorn
+
+For every scale a synthetic data directory is generated once (under
+``benchmarks/.data``) and the app is started fresh with ``DATA_DIR``
+pointing at it and OSRM/Nominatim pointing at the local fakes:
+
+* ``inprocess`` -- a subprocess imports the app and drives it through
+  the Flask test client; it also times each workbook loader.
+* ``gunicorn`` -- ``gunicorn wsgi:app`` on a local port, driven over HTTP.
+
+Each endpoint gets a first (cold) request, then ``--requests`` requests
+from ``--concurrency`` threads. The report shows p50/p99 latency,
+throughput, errors, cold-start time and peak RSS.
+"""
+import argparse
+import itertools
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+import numpy as np
+
+from benchmarks import fake_upstreams, synthetic
+
+DATA_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.data')
+INDIA_BBOX = (68.5, 8.0, 97.0, 35.0)  # west, south, east, north
+
+
+def endpoint_paths(manifest, count=200, seed=1):
+    """Request paths per endpoint; each benchmark cycles through its list."""
+    rng = np.random.default_rng(seed)
+    west, south, east, north = INDIA_BBOX
+    coords = np.column_stack([rng.uniform(south, north, count), rng.uniform(west, east, count),
+                              rng.uniform(south, north, count), rng.uniform(west, east, count)])
+    cities = manifest['cities'] or ['Raipur']
+    return {
+        'plants': ['/api/plants'],
+        'biomass_all': ['/api/biomass/all'],
+        'districts': [f'/api/districts/{quote(s)}/{quote(d.lower())}' for s, d in manifest['district_sample']],
+        'biomass_state': [f'/api/biomass?state={quote(s)}' for s in manifest['biomass_states']],
+        'distance': ['/api/distance?lat1=%.5f&lon1=%.5f&lat2=%.5f&lon2=%.5f' % tuple(c) for c in coords],
+        'distance_cities': [f'/api/distance?origin={quote(a)}&destination={quote(b)}'
+                            for a, b in zip(cities, cities[1:] + cities[:1])],
+    }
+
+
+def run_load(call, paths, requests, concurrency):
+    """Issue ``requests`` calls over ``concurrency`` threads; ``call(path)`` returns a status."""
+    start = time.perf_counter()
+    status = call(paths[0])
+    first_ms = (time.perf_counter() - start) * 1000
+    plan = list(itertools.islice(itertools.cycle(paths), requests))
+
+    def worker(chunk):
+        latencies, errors = [], 0
+        for path in chunk:
+            t = time.perf_counter()
+            if call(path) >= 500:
+                errors += 1
+            latencies.append(time.perf_counter() - t)
+        return latencies, errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(worker, [plan[i::concurrency] for i in range(concurrency)]))
+    wall = time.perf_counter() - start
+    latencies = np.array([v for lat, _ in results for v in lat]) * 1000
+    return {
+        'first_status': status,
+        'first_ms': round(first_ms, 2),
+        'p50_ms': round(float(np.percentile(latencies, 50)), 2),
+        'p99_ms': round(float(np.percentile(latencies, 99)), 2),
+        'rps': round(len(latencies) / wall, 1),
+        'errors': sum(e for _, e in results),
+    }
+
+
+def app_env(data_dir, upstream_url):
+    env = dict(os.environ, DATA_DIR=data_dir, OSRM_URL=upstream_url,
+               NOMINATIM_URL=f'{upstream_url}/search', GEOCODE_MIN_INTERVAL='0',
+               TILE_CACHE_DIR=os.path.join(data_dir, 'tile_cache'))
+    return env
+
+
+# -- in-process ---------------------------------------------------------------
+
+def inprocess_worker(manifest_path, output, requests, concurrency):
+    """Runs in a fresh interpreter with DATA_DIR already set."""
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    rss_mb = lambda: round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+    start = time.perf_counter()
+    import app as app_module
+    app_module.datasets.load_all()
+    report = {'cold_start_s': round(time.perf_counter() - start, 3), 'cold_rss_mb': rss_mb()}
+
+    report['loaders_ms'] = {}
+    for name in ('load_steel_plant_data', 'load_sponge_plant_data', 'load_all_biomass_data',
+                 'load_biomass_data'):
+        start = time.perf_counter()
+        getattr(app_module, name)()
+        report['loaders_ms'][name] = round((time.perf_counter() - start) * 1000, 1)
+
+    clients = threading.local()
+
+    def call(path):
+        client = getattr(clients, 'client', None)
+        if client is None:
+            client = clients.client = app_module.app.test_client()
+        response = client.get(path, headers={'Accept-Encoding': 'gzip'})
+        response.get_data()
+        return response.status_code
+
+    report['endpoints'] = {}
+    for name, paths in endpoint_paths(manifest).items():
+        result = run_load(call, paths, requests, concurrency)
+        result['peak_rss_mb'] = rss_mb()
+        report['endpoints'][name] = result
+    with open(output, 'w') as f:
+        json.dump(report, f)
+
+
+def run_inprocess(data_dir, upstream_url, requests, concurrency):
+    with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as f:
+        output = f.name
+    try:
+        subprocess.run([sys.executable, '-m', 'benchmarks.run', '--worker',
+                        os.path.join(data_dir, synthetic.MANIFEST), output,
+                        str(requests), str(concurrency)],
+                       cwd=synthetic.REPO_DIR, env=app_env(data_dir, upstream_url), check=True,
+                       stdout=subprocess.DEVNULL)
+        with open(output) as f:
+            return json.load(f)
+    finally:
+        os.unlink(output)
+
+
+# -- gunicorn -----------------------------------------------------------------
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _peak_rss_mb(pid):
+    """Sum of VmHWM over ``pid`` and its children, from /proc (Linux only)."""
+    pids = [pid]
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    if int(f.read().rsplit(')', 1)[1].split()[1]) == pid:
+                        pids.append(int(entry))
+            except (OSError, IndexError, ValueError):
+                continue
+    total = 0
+    for p in pids:
+        try:
+            with open(f'/proc/{p}/status') as f:
+                total += next(int(line.split()[1]) for line in f if line.startswith('VmHWM'))
+        except (OSError, StopIteration):
+            continue
+    return round(total / 1024, 1)
+
+
+def run_gunicorn(data_dir, manifest, upstream_url, requests, concurrency, workers, threads):
+    import requests as http
+    port = _free_port()
+    base = f'http://127.0.0.1:{port}'
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--workers', str(workers),
+                                '--threads', str(threads), '--bind', f'127.0.0.1:{port}', 'wsgi:app'],
+                               cwd=synthetic.REPO_DIR, env=app_env(data_dir, upstream_url),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError('gunicorn exited during startup')
+            try:
+                if http.get(f'{base}/api/plants', timeout=5).status_code == 200:
+                    break
+            except http.RequestException:
+                time.sleep(0.1)
+        report = {'cold_start_s': round(time.perf_counter() - start, 3),
+                  'cold_rss_mb': _peak_rss_mb(process.pid), 'endpoints': {}}
+        sessions = threading.local()
+
+        def call(path):
+            session = getattr(sessions, 'session', None)
+            if session is None:
+                session = sessions.session = http.Session()
+            return session.get(base + path, timeout=60).status_code
+
+        for name, paths in endpoint_paths(manifest).items():
+            result = run_load(call, paths, requests, concurrency)
+            result['peak_rss_mb'] = _peak_rss_mb(process.pid)
+            report['endpoints'][name] = result
+        return report
+    finally:
+        process.terminate()
+        process.wait()
+
+
+# -- report -------------------------------------------------------------------
+
+def print_report(mode, scale, manifest, report):
+    print(f"\n== {mode}, {scale}x ({manifest['plants']} plants, {manifest['districts']} districts): "
+          f"cold start {report['cold_start_s']:.2f}s, {report['cold_rss_mb']:.0f} MB")
+    for name, ms in report.get('loaders_ms', {}).items():
+        print(f"   {name:<24} {ms:>9.1f} ms")
+    print(f"   {'endpoint':<16}{'first ms':>10}{'p50 ms':>10}{'p99 ms':>10}{'req/s':>10}{'errors':>8}{'RSS MB':>9}")
+    for name, r in report['endpoints'].items():
+        print(f"   {name:<16}{r['first_ms']:>10.1f}{r['p50_ms']:>10.2f}{r['p99_ms']:>10.2f}"
+              f"{r['rps']:>10.1f}{r['errors']:>8}{r['peak_rss_mb']:>9.0f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--scales', default='1,10,100')
+    parser.add_argument('--modes', default='inprocess,gunicorn')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--upstream-latency-ms', type=float, default=20)
+    parser.add_argument('--json', help='also write the full results to this file')
+    args = parser.parse_args(argv)
+
+    server, upstream_url = fake_upstreams.start(args.upstream_latency_ms / 1000)
+    results = []
+    try:
+        for scale in (int(s) for s in args.scales.split(',')):
+            start = time.perf_counter()
+            data_dir, manifest = synthetic.generate(scale, DATA_ROOT)
+            print(f"data {scale}x ready in {time.perf_counter() - start:.1f}s: {data_dir}")
+            for mode in args.modes.split(','):
+                # Each run starts from an empty geocode cache.
+                for suffix in ('', '-wal', '-shm'):
+                    path = os.path.join(data_dir, 'geocode_cache.sqlite3' + suffix)
+                    if os.path.exists(path):
+                        os.unlink(path)
+                if mode == 'inprocess':
+                    report = run_inprocess(data_dir, upstream_url, args.requests, args.concurrency)
+                elif mode == 'gunicorn':
+                    report = run_gunicorn(data_dir, manifest, upstream_url, args.requests,
+                                          args.concurrency, args.workers, args.threads)
+                else:
+                    parser.error(f'unknown mode: {mode}')
+                print_report(mode, scale, manifest, report)
+                results.append({'mode': mode, 'scale': scale, **report})
+    finally:
+        server.shutdown()
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=1)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--worker':
+        inprocess_worker(sys.argv[2], sys.argv[3], int(sys.argv[4]), int(sys.argv[5]))
+    else:
+        main()
@@ -0,0 +1,100 @@
+"""Synthetic scale-up copies of the workbooks for the benchmarks.
+
+``generate(scale, root)`` writes a data directory holding every workbook
+the app reads, with ``scale`` times as many plants and biomass districts
+as the real ones. Copies after the first get a numbered name suffix and
+jittered coordinates, so lookups stay distinct and spatial queries see a
+realistic spread. A ``manifest.json`` lists names the benchmark can use
+to build request paths.
+"""
+import json
+import os
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+import biomass
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PLANT_WORKBOOKS = ('data.xlsx', 'Sponge_Iron_Plants.xlsx')
+MANIFEST = 'manifest.json'
+SAMPLE_SIZE = 200
+
+
+def _scale_plants(df, scale, rng):
+    copies = [df]
+    for i in range(1, scale):
+        copy = df.copy()
+        copy['Sponge Iron Plant'] = copy['Sponge Iron Plant'].astype(str) + f' #{i}'
+        for column in ('Latitude', 'Longitude'):
+            values = pd.to_numeric(copy[column], errors='coerce')
+            copy[column] = (values + rng.uniform(-0.05, 0.05, len(copy))).round(6)
+        copies.append(copy)
+    return pd.concat(copies, ignore_index=True)
+
+
+def _write_biomass_workbook(path, df, scale):
+    """Write a ``<State>_biomass.xlsx`` with the two-row metric x crop header."""
+    districts = df.iloc[:, 0].astype(str).tolist()
+    values = df.loc[:, biomass.COLUMNS].to_numpy(dtype=float)
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    top, bottom = [None], ['District']
+    for metric in biomass.METRICS.values():
+        top += [metric] + [None] * (len(biomass.CROPS) - 1)
+        bottom += list(biomass.CROPS.values())
+    sheet.append(top)
+    sheet.append(bottom)
+    names = []
+    for i in range(scale):
+        suffix = f' {i + 1}' if i else ''
+        for district, row in zip(districts, values):
+            names.append(district + suffix)
+            sheet.append([district + suffix] + [None if np.isnan(v) else float(v) for v in row])
+    workbook.save(path)
+    return names
+
+
+def generate(scale, root, source_dir=REPO_DIR, seed=0):
+    """Create (or reuse) the data directory for ``scale``; returns ``(path, manifest)``."""
+    target = os.path.join(root, f'scale-{scale}')
+    manifest_path = os.path.join(target, MANIFEST)
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            return target, json.load(f)
+    os.makedirs(target, exist_ok=True)
+    rng = np.random.default_rng(seed)
+
+    plants = 0
+    cities = set()
+    for name in PLANT_WORKBOOKS:
+        df = _scale_plants(pd.read_excel(os.path.join(source_dir, name)), scale, rng)
+        df.to_excel(os.path.join(target, name), index=False)
+        plants += len(df)
+        cities.update(str(c).strip() for c in df['City/ District'].dropna())
+
+    sheets = pd.read_excel(os.path.join(source_dir, 'biomass.xlsx'), sheet_name=None)
+    with pd.ExcelWriter(os.path.join(target, 'biomass.xlsx')) as writer:
+        for sheet, df in sheets.items():
+            pd.concat([df] * scale, ignore_index=True).to_excel(writer, sheet_name=sheet, index=False)
+    biomass_states = sorted({str(s).strip() for df in sheets.values() for s in df['States'].dropna()})
+
+    districts = []
+    for state, path in biomass.discover(source_dir).items():
+        df = biomass.read_workbook(path)
+        names = _write_biomass_workbook(os.path.join(target, os.path.basename(path)), df, scale)
+        districts.extend([state, name] for name in names)
+
+    pick = lambda items: [items[i] for i in rng.permutation(len(items))[:SAMPLE_SIZE].tolist()]
+    manifest = {
+        'scale': scale,
+        'plants': plants,
+        'districts': len(districts),
+        'district_sample': pick(districts),
+        'biomass_states': biomass_states,
+        'cities': pick(sorted(c for c in cities if c)),
+    }
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    return target, manifest
@@ -0,0 +1,200 @@
+"""District-level biomass workbooks (``<State>_biomass.xlsx``).
+
+Every workbook has the district in its first column followed by a
+two-row header of metric x crop. The state is taken from the file name,
+so adding a state only needs a new workbook in the data directory.
+"""
+import glob
+import multiprocessing
+import os
+import sys
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import snapshot
+from datasets import is_temporary, require_columns
+
+BIOMASS_PATTERN = '*_biomass.xlsx'
+
+# Output key -> workbook header, in the order the API has always used.
+METRICS = {
+    'bioenergy_potential': 'Bioenergy Potential GJ',
+    'gross_biomass': 'Gross Biomass Kilo tonnes',
+    'surplus_biomass': 'Surplus Biomass Kilo tonnes',
+}
+CROPS = {
+    'kharif_rice': 'Kharif Rice',
+    'rabi_rice': 'Rabi Rice',
+    'wheat': 'Wheat',
+    'cotton': 'Cotton',
+    'sugarcane': 'Sugarcane',
+}
+COLUMNS = [(metric, crop) for metric in METRICS.values() for crop in CROPS.values()]
+
+# File names that do not spell the state the way the map does.
+STATE_NAME_FIXES = {
+    'Andra Pradesh': 'Andhra Pradesh',
+    'Kerela': 'Kerala',
+    'Maharastra': 'Maharashtra',
+}
+
+# Parse in a process pool only when at least this many workbooks miss the snapshot.
+POOL_THRESHOLD = 2
+
+
+def state_for_file(path):
+    """Return the state a biomass workbook describes, e.g. Kerela_biomass.xlsx -> Kerala."""
+    stem = os.path.basename(path)[:-len('_biomass.xlsx')]
+    name = stem.replace('_', ' ').strip()
+    return STATE_NAME_FIXES.get(name, name)
+
+
+def discover(base_dir):
+    """Return ``{state: path}`` for every biomass workbook in ``base_dir``."""
+    return {state_for_file(path): path
+            for path in sorted(glob.glob(os.path.join(base_dir, BIOMASS_PATTERN)))
+            if not is_temporary(path)}
+
+
+def read_workbook(path):
+    return snapshot.read_excel(path, header=[0, 1])
+
+
+def frame_to_block(df):
+    """Split one state's frame into its district names and a ``district x metric x crop`` array."""
+    districts = df.iloc[:, 0].tolist()
+    values = df.loc[:, COLUMNS].to_numpy(dtype=float)
+    return districts, values.reshape(len(df), len(METRICS), len(CROPS))
+
+
+def pool_context():
+    """Start method for the parsing pool.
+
+    Reloads run in gunicorn workers next to request and watcher threads,
+    and a forked child could inherit a lock one of them holds. forkserver
+    (spawn where it is unavailable) starts the children from a clean
+    single-threaded process.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+def load_all(base_dir):
+    """Load every state's biomass records, parsing stale workbooks in parallel."""
+    files = discover(base_dir)
+    stale = [state for state, path in files.items()
+             if not snapshot.is_fresh(path, header=[0, 1])]
+    frames = {}
+    workers = min(len(stale), os.cpu_count() or 1)
+    # A single worker would only add process start-up to a serial parse.
+    if len(stale) >= POOL_THRESHOLD and workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=pool_context()) as pool:
+            for state, df in zip(stale, pool.map(read_workbook, [files[s] for s in stale])):
+                frames[state] = df
+    for state, path in files.items():
+        if state not in frames:
+            frames[state] = read_workbook(path)
+        require_columns(frames[state].columns, COLUMNS, path)
+    return BiomassTable({state: frame_to_block(frames[state]) for state in files})
+
+
+class BiomassTable(Mapping):
+    """Every state's district records, stored as arrays.
+
+    ``values`` is one read-only float64 ``district x metric x crop`` block
+    (NaN where the workbook has no value) in which each state owns a
+    contiguous run of rows; state and district names are interned. The
+    table reads like the ``{state: [record, ...]}`` dict the API returns
+    (with None for the missing values), but records are only built when
+    asked for, so holding the data costs about 120 bytes per district
+    rather than four dicts and fifteen float objects.
+    """
+
+    def __init__(self, blocks):
+        """``blocks`` maps each state to ``(district names, values)``."""
+        self._rows = {}
+        districts, arrays = [], []
+        for state, (names, values) in blocks.items():
+            start = len(districts)
+            districts.extend(sys.intern(n) if isinstance(n, str) else n for n in names)
+            arrays.append(np.asarray(values, dtype=float).reshape(len(names), len(METRICS), len(CROPS)))
+            self._rows[sys.intern(state)] = range(start, len(districts))
+        self.districts = tuple(districts)
+        self.values = (np.concatenate(arrays) if arrays
+                       else np.zeros((0, len(METRICS), len(CROPS))))
+        self.values.flags.writeable = False
+
+    def __getitem__(self, state):
+        rows = self._rows[state]
+        return self._records(state, rows.start, rows.stop)
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def rows(self, state):
+        """Row numbers of ``state``'s districts in ``values``."""
+        return self._rows[state]
+
+    def _records(self, state, start, stop):
+        records = []
+        for district, block in zip(self.districts[start:stop], self.values[start:stop].tolist()):
+            record = {'state': state, 'district': district}
+            for key, row in zip(METRICS, block):
+                # JSON has no NaN; a missing value is null in the API.
+                record[key] = {crop: None if v != v else v for crop, v in zip(CROPS, row)}
+            records.append(record)
+        return records
+
+    def record(self, state, row):
+        """The API record of one row of ``state``."""
+        return self._records(state, row, row + 1)[0]
+
+    def to_dict(self):
+        """Every record in the API's ``{state: [record, ...]}`` shape."""
+        return {state: self[state] for state in self._rows}
+
+
+class BiomassCube:
+    """Every biomass value as one ``state x district x metric x crop`` array.
+
+    States with fewer districts are padded with zeros, and missing cells
+    count as zero, so any total is a masked sum over the array. The
+    weights for a crop selection are a length-5 vector, so a summary
+    is a single small matrix product.
+    """
+
+    def __init__(self, table):
+        self.states = list(table)
+        rows = [table.rows(state) for state in self.states]
+        self.districts = [list(table.districts[r.start:r.stop]) for r in rows]
+        width = max((len(r) for r in rows), default=0)
+        self.values = np.zeros((len(self.states), width, len(METRICS), len(CROPS)))
+        for s, r in enumerate(rows):
+            self.values[s, :len(r)] = np.nan_to_num(table.values[r.start:r.stop])
+        self.metrics = list(METRICS)
+        self.crops = list(CROPS)
+
+    def totals(self, metric, crops=None):
+        """``(states, districts)`` array of ``metric`` summed over ``crops`` (all if None)."""
+        weights = np.ones(len(self.crops))
+        if crops is not None:
+            weights = np.isin(self.crops, list(crops)).astype(float)
+        return self.values[:, :, self.metrics.index(metric)] @ weights
+
+    def summary(self, level, metric, crops=None, state=None):
+        """Totals per state, or per district (optionally of one state) as ``{state: {district: total}}``."""
+        totals = self.totals(metric, crops)
+        rows = range(len(self.states))
+        if state is not None:
+            rows = [s for s in rows if self.states[s].lower() == state.lower()]
+        if level == 'state':
+            by_state = totals.sum(axis=1)
+            return {self.states[s]: round(float(by_state[s]), 2) for s in rows}
+        totals = np.round(totals, 2)
+        return {self.states[s]: dict(zip(self.districts[s], totals[s, :len(self.districts[s])].tolist()))
+                for s in rows}
@@ -0,0 +1,224 @@
+"""In-process registry for the workbook-backed datasets.
+
+Each dataset is parsed once and then served from memory. The registry
+notices (at most every ``check_interval`` seconds) when source files
+change on disk and rebuilds the changed datasets and everything derived
+from them. The new values are built next to the current ones and
+published together with a single reference assignment, so requests see
+the old or the new generation of every dataset and never a partial
+load. A dataset whose loader fails (e.g. a workbook with the wrong
+header) keeps serving its previous value until its sources change again.
+
+Without a watcher the request that notices a change pays for the
+rebuild; after ``watch()`` a background thread checks and rebuilds
+instead, and only once a changed file has stopped changing. Office lock
+files (``~$data.xlsx``), hidden files and temp files never count as
+sources.
+"""
+import glob
+import os
+import threading
+import time
+
+TEMPORARY_PREFIXES = ('~$', '.')
+TEMPORARY_SUFFIXES = ('~', '.tmp', '.part', '.swp')
+
+
+def is_temporary(path):
+    """True for lock, hidden and partially written files next to the workbooks."""
+    name = os.path.basename(path)
+    return name.startswith(TEMPORARY_PREFIXES) or name.endswith(TEMPORARY_SUFFIXES)
+
+
+class SchemaError(ValueError):
+    """A source file does not have the columns its loader needs."""
+
+
+def require_columns(columns, required, path):
+    """Raise SchemaError naming ``path`` if any of ``required`` is not in ``columns``."""
+    missing = [column for column in required if column not in set(columns)]
+    if missing:
+        raise SchemaError(f"{os.path.basename(path)} is missing column(s): "
+                          + ', '.join(map(str, missing)))
+
+
+class Dataset:
+    """One registered dataset and its reload bookkeeping."""
+
+    __slots__ = ('name', 'sources', 'depends_on', 'loader', 'default',
+                 'checked_at', 'seen', 'failed', 'error', 'seconds')
+
+    def __init__(self, name, sources, loader, default, depends_on=()):
+        self.name = name
+        self.sources = tuple(sources)
+        self.depends_on = tuple(depends_on)
+        self.loader = loader
+        self.default = default
+        self.checked_at = 0.0
+        self.seen = None      # last stamp observed while waiting for files to settle
+        self.failed = None    # stamp whose load failed; not retried until it changes
+        self.error = None
+        self.seconds = None
+
+
+class DatasetRegistry:
+    """Parses every registered source once and reloads it when it changes.
+
+    Values handed out by ``get`` are shared between requests and threads;
+    callers must treat them as read-only.
+    """
+
+    def __init__(self, base_dir, check_interval=2.0):
+        self.base_dir = base_dir
+        self.check_interval = check_interval
+        self._datasets = {}
+        self._current = {}  # name -> (value, stamp), replaced as a whole
+        self._lock = threading.RLock()
+        self._watcher = None
+
+    def register(self, name, sources, loader, default=None):
+        """Register ``loader`` as the producer of ``name``.
+
+        ``sources`` are file names or glob patterns relative to the base
+        directory; their modification times decide when to reload.
+        """
+        self._datasets[name] = Dataset(name, sources, loader, default)
+
+    def register_derived(self, name, depends_on, builder, default=None):
+        """Register ``name`` as ``builder(*values)`` of other datasets.
+
+        Indexes and other structures computed from the raw datasets are
+        rebuilt once whenever one of ``depends_on`` is reloaded, and are
+        published together with it.
+        """
+        self._datasets[name] = Dataset(name, (), builder, default, depends_on)
+
+    def paths(self, name):
+        """Return the source files currently backing ``name``."""
+        paths = []
+        for source in self._datasets[name].sources:
+            pattern = os.path.join(self.base_dir, source)
+            if glob.has_magic(source):
+                paths.extend(p for p in sorted(glob.glob(pattern)) if not is_temporary(p))
+            elif os.path.exists(pattern):
+                paths.append(pattern)
+        return paths
+
+    def _stamp(self, dataset, generation):
+        if dataset.depends_on:
+            return tuple(generation[dep][1] for dep in dataset.depends_on)
+        stamp = []
+        for path in self.paths(dataset.name):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            stamp.append((os.path.basename(path), st.st_mtime_ns, st.st_size))
+        return tuple(stamp)
+
+    def _update(self, name, generation, done, recheck, settle):
+        """Bring ``name`` and its dependencies in ``generation`` up to date."""
+        if name in done:
+            return
+        done.add(name)
+        dataset = self._datasets[name]
+        for dep in dataset.depends_on:
+            self._update(dep, generation, done, recheck, settle)
+        current = generation.get(name)
+        now = time.monotonic()
+        if (current is not None and not recheck and not dataset.depends_on
+                and now - dataset.checked_at < self.check_interval):
+            return
+        stamp = self._stamp(dataset, generation)
+        dataset.checked_at = now
+        if current is not None and stamp in (current[1], dataset.failed):
+            return
+        if settle and current is not None and not dataset.depends_on and stamp != dataset.seen:
+            # Possibly still being copied; build once it is unchanged for a check.
+            dataset.seen = stamp
+            return
+        started = time.perf_counter()
+        try:
+            value = dataset.loader(*(generation[dep][0] for dep in dataset.depends_on))
+        except Exception as e:
+            print(f"Error loading {name}: {str(e)}")
+            dataset.failed, dataset.error = stamp, str(e)
+            if current is None:
+                generation[name] = (dataset.default, stamp)
+            return
+        dataset.seconds = time.perf_counter() - started
+        dataset.failed = dataset.error = None
+        generation[name] = (value, stamp)
+
+    def refresh(self, names=None, recheck=True, settle=False):
+        """Rebuild whatever changed and publish it at once; returns the names (re)loaded."""
+        with self._lock:
+            generation = dict(self._current)
+            done = set()
+            for name in names or self._datasets:
+                self._update(name, generation, done, recheck, settle)
+            changed = [name for name, entry in generation.items()
+                       if self._current.get(name) is not entry]
+            if changed:
+                self._current = generation
+        return changed
+
+    def get(self, name):
+        """Return the current value of ``name``, reloading it if stale."""
+        entry = self._current.get(name)
+        if entry is not None and (self.watching() or
+                                  time.monotonic() - self._datasets[name].checked_at < self.check_interval):
+            return entry[0]
+        self.refresh([name], recheck=False)
+        return self._current[name][0]
+
+    def version(self, name):
+        """Return an opaque token that changes whenever ``name`` is reloaded."""
+        self.get(name)
+        return self._current[name][1]
+
+    def load_all(self):
+        """Load every registered dataset; used to warm a process at startup."""
+        self.refresh()
+
+    def names(self):
+        return list(self._datasets)
+
+    def status(self):
+        """``{name: {'loaded', 'seconds', 'error'}}`` of every dataset."""
+        return {name: {'loaded': name in self._current, 'seconds': dataset.seconds,
+                       'error': dataset.error}
+                for name, dataset in self._datasets.items()}
+
+    def watching(self):
+        watcher = self._watcher
+        return watcher is not None and watcher[0] == os.getpid() and watcher[1].is_alive()
+
+    def watch(self, interval=None):
+        """Check and rebuild from a background thread of this process from now on.
+
+        Threads do not survive ``fork``, so each gunicorn worker starts its
+        own; calling this again in the same process does nothing.
+        """
+        if self.watching():
+            return
+        with self._lock:
+            if self.watching():
+                return
+            thread = threading.Thread(target=self._watch, args=(interval or self.check_interval,),
+                                      name='dataset-watcher', daemon=True)
+            self._watcher = (os.getpid(), thread)
+            thread.start()
+
+    def _watch(self, interval):
+        while True:
+            time.sleep(interval)
+            before = self._current
+            try:
+                changed = self.refresh(settle=True)
+            except Exception as e:
+                print(f"Error refreshing datasets: {str(e)}")
+                continue
+            reloaded = [name for name in changed if name in before]
+            if reloaded:
+                print(f"Reloaded {', '.join(reloaded)}")
@@ -0,0 +1,224 @@
+"""(state, district) lookup table shared by the district detail endpoints.
+
+Plant workbooks, biomass workbooks and the map's GeoJSON spell the same
+places differently (``ANANTAPUR`` / ``Anantapur``, ``Kerela`` /
+``Kerala``, ``Bellary`` / ``Ballari``). Every name goes through
+``state_key`` / ``district_key`` before it is stored or looked up, so a
+map click resolves with a single dictionary hit.
+
+When the district polygons are available, plants are not matched by
+name at all: ``DistrictPolygons.locate`` places each plant's coordinates
+in its district polygon, and both plants and biomass records are filed
+under that polygon. The free-text ``City/ District`` column is only used
+for plants without usable coordinates.
+"""
+import re
+
+import numpy as np
+
+import biomass
+from geo import points_in_polygon
+
+
+def normalize_name(name):
+    """Lower-case ``name`` and collapse whitespace, hyphens and dots."""
+    name = re.sub(r'[\s\-_.]+', ' ', str(name).lower())
+    return name.strip()
+
+
+def _alias_table(aliases):
+    return {normalize_name(variant): normalize_name(canonical)
+            for variant, canonical in aliases.items()}
+
+
+STATE_ALIASES = _alias_table({
+    **biomass.STATE_NAME_FIXES,
+    'Orissa': 'Odisha',
+    'Pondicherry': 'Puducherry',
+    'Chattisgarh': 'Chhattisgarh',
+    'Telengana': 'Telangana',
+})
+
+# Older or alternative district names -> the spelling used by the biomass workbooks.
+DISTRICT_ALIASES = _alias_table({
+    'Bagalkote': 'Bagalkot',
+    'Ballari': 'Bellary',
+    'Belagavi': 'Belgaum',
+    'Bangalore': 'Bangalore Urban',
+    'Bengaluru Urban': 'Bangalore Urban',
+    'Bengaluru Rural': 'Bangalore Rural',
+    'Chamarajanagara': 'Chamaraja-nagar',
+    'Chamarajanagar': 'Chamaraja-nagar',
+    'Chikkaballapura': 'Chik Ballapur',
+    'Chickballapur': 'Chik Ballapur',
+    'Chikkamagaluru': 'Chikmagalur',
+    'Kalaburagi': 'Gulbarga',
+    'Mysuru': 'Mysore',
+    'Ramanagara': 'Ramanagaram',
+    'Shivamogga': 'Shimoga',
+    'Tumakuru': 'Tumkur',
+    'Thiruvananthapuram': 'Thiruvanthapuram',
+    'S.P.S. Nellore': 'Nellore',
+    'Lahaul and Spiti': 'Lahaul',
+    'Ribhoi': 'Ri Bhoi',
+    'Jagatsinghapur': 'Jagatsinghpur',
+    'Sunderghar': 'Sundargarh',
+    'Unokoti': 'Unakoti',
+    'Mumbai': 'Mumbai City',
+})
+
+
+def state_key(name):
+    key = normalize_name(name)
+    return STATE_ALIASES.get(key, key)
+
+
+def district_key(name):
+    key = normalize_name(name)
+    if key in DISTRICT_ALIASES:
+        return DISTRICT_ALIASES[key]
+    # "Dhalai (Ambassa)" -> "dhalai": drop the headquarters suffix.
+    stripped = re.sub(r'\s*\(.*?\)\s*', ' ', key).strip()
+    return DISTRICT_ALIASES.get(stripped, stripped)
+
+
+class DistrictPolygons:
+    """District boundaries for point-in-polygon joins.
+
+    Built from the ``Topology`` of every state file. Districts are
+    numbered in file order; ``dt_code`` is not unique on its own (some
+    states reuse codes and a few new districts have code 0), so the
+    number, not the code, identifies a district here.
+    """
+
+    def __init__(self, topologies):
+        self.codes, self.states, self.districts = [], [], []
+        self._rings, self._exterior, bboxes = [], [], []
+        self._centroids = None
+        self._by_name = {}
+        for topology in topologies:
+            for properties, polygons in topology.feature_polygons(topology.simplified_arcs(0.0)):
+                rings = [ring for polygon in polygons for ring in polygon]
+                if not rings:
+                    continue
+                key = (state_key(properties.get('st_nm', '')), district_key(properties.get('district', '')))
+                self._by_name.setdefault(key, len(self.codes))
+                self.codes.append(str(properties.get('dt_code', '')))
+                self.states.append(properties.get('st_nm', ''))
+                self.districts.append(properties.get('district', ''))
+                self._rings.append(rings)
+                self._exterior.append([k == 0 for polygon in polygons for k in range(len(polygon))])
+                stacked = np.concatenate(rings)
+                bboxes.append(np.concatenate([stacked.min(axis=0), stacked.max(axis=0)]))
+        self._bboxes = np.array(bboxes).reshape(-1, 4)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def centroids(self):
+        """``(n, 2)`` array of the area-weighted ``(lat, lon)`` centroid of each district."""
+        if self._centroids is not None:
+            return self._centroids
+        result = np.full((len(self.codes), 2), np.nan)
+        for i, (rings, exterior) in enumerate(zip(self._rings, self._exterior)):
+            area = cx = cy = 0.0
+            for ring, is_exterior in zip(rings, exterior):
+                x0, y0, x1, y1 = ring[:-1, 0], ring[:-1, 1], ring[1:, 0], ring[1:, 1]
+                cross = x0 * y1 - x1 * y0
+                ring_area = cross.sum() / 2
+                # Winding order is not reliable in the source files: count
+                # exteriors positive and holes negative whatever their direction.
+                sign = np.sign(ring_area) * (1 if is_exterior else -1)
+                area += sign * ring_area
+                cx += sign * ((x0 + x1) * cross).sum() / 6
+                cy += sign * ((y0 + y1) * cross).sum() / 6
+            if area:
+                result[i] = cy / area, cx / area
+        self._centroids = result
+        return result
+
+    def find(self, state, district):
+        """Number of the district called ``district`` in ``state``, or None."""
+        return self._by_name.get((state_key(state), district_key(district)))
+
+    def locate(self, lat, lon):
+        """Number of the district containing each point; -1 outside all of them or if NaN."""
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        result = np.full(len(lat), -1, dtype=np.int64)
+        for i, (west, south, east, north) in enumerate(self._bboxes):
+            candidates = np.flatnonzero((result < 0) & (lon >= west) & (lon <= east)
+                                        & (lat >= south) & (lat <= north))
+            if len(candidates):
+                hits = points_in_polygon(lon[candidates], lat[candidates], self._rings[i])
+                result[candidates[hits]] = i
+        return result
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class DistrictIndex:
+    """Plants and biomass record of every district.
+
+    Entries are keyed by district number when ``polygons`` is given and
+    the district is known to it, and by normalized names otherwise.
+    Every plant is returned with the ``dt_code`` of the polygon it lies
+    in ('' if none). Biomass records are built from ``biomass_table``
+    (a ``biomass.BiomassTable``) when looked up.
+    """
+
+    def __init__(self, plants_by_state, biomass_table, polygons=None):
+        self._polygons = polygons
+        self._biomass = biomass_table
+        self._entries = {}
+        plants = [(state, plant) for state, group in plants_by_state.items() for plant in group]
+        if polygons is not None and len(polygons):
+            located = polygons.locate([_float(p.get('Latitude')) for _, p in plants],
+                                      [_float(p.get('Longitude')) for _, p in plants]).tolist()
+        else:
+            located = [-1] * len(plants)
+        for (state, plant), number in zip(plants, located):
+            if number >= 0:
+                key = number
+                plant = {**plant, 'dt_code': polygons.codes[number]}
+            else:
+                key = self._key(state, plant.get('City/ District', ''))
+                plant = {**plant, 'dt_code': ''}
+            self._entry(key)['plants'].append(plant)
+        for state in biomass_table:
+            for row in biomass_table.rows(state):
+                entry = self._entry(self._key(state, biomass_table.districts[row]))
+                if entry['biomass'] is None:
+                    entry['biomass'] = (state, row)
+
+    def _key(self, state, district):
+        number = self._polygons.find(state, district) if self._polygons is not None else None
+        return number if number is not None else (state_key(state), district_key(district))
+
+    def _entry(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = {'plants': [], 'biomass': None}
+        return entry
+
+    def lookup(self, state, district):
+        """Return ``(plants, biomass)`` for a district; empty if unknown."""
+        entry = self._entries.get(self._key(state, district))
+        if entry is None:
+            return [], None
+        if entry['biomass'] is None:
+            return entry['plants'], None
+        return entry['plants'], self._biomass.record(*entry['biomass'])
+
+    def code(self, state, district):
+        """``dt_code`` of a district, or None if it has no polygon."""
+        number = self._polygons.find(state, district) if self._polygons is not None else None
+        return self._polygons.codes[number] if number is not None else None
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,188 @@
+"""Great-circle helpers and the spatial index over plant coordinates.
+
+Points are stored as 3-D unit vectors. The straight-line (chord)
+distance between two unit vectors grows monotonically with their
+great-circle distance, so a plain Euclidean KD-tree answers nearest and
+radius queries on the sphere without any trigonometry per node.
+"""
+import heapq
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def to_unit_vectors(lat, lon):
+    """Convert degree arrays of latitude/longitude to an ``(n, 3)`` array."""
+    lat = np.radians(np.asarray(lat, dtype=float))
+    lon = np.radians(np.asarray(lon, dtype=float))
+    cos_lat = np.cos(lat)
+    return np.stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(np.asarray(chord) / 2, 1.0))
+
+
+def km_to_chord(km):
+    return 2 * np.sin(np.minimum(np.asarray(km, dtype=float) / (2 * EARTH_RADIUS_KM), np.pi / 2))
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km; arguments broadcast like NumPy arrays."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class KDTree:
+    """Static KD-tree over ``(n, 3)`` points with vectorized leaf scans."""
+
+    def __init__(self, points, leaf_size=16):
+        self.points = np.asarray(points, dtype=float).reshape(-1, 3)
+        self.order = np.arange(len(self.points))
+        self.leaf_size = leaf_size
+        # node = (start, end, dim, split, left, right); leaves have dim == -1
+        self.nodes = []
+        if len(self.points):
+            self._build(0, len(self.points))
+        self.points = self.points[self.order]
+
+    def _build(self, start, end):
+        node_id = len(self.nodes)
+        self.nodes.append(None)
+        if end - start <= self.leaf_size:
+            self.nodes[node_id] = (start, end, -1, 0.0, -1, -1)
+            return node_id
+        idx = self.order[start:end]
+        pts = self.points[idx]
+        dim = int(np.argmax(pts.max(axis=0) - pts.min(axis=0)))
+        mid = (end - start) // 2
+        part = np.argpartition(pts[:, dim], mid)
+        self.order[start:end] = idx[part]
+        split = float(pts[part[mid], dim])
+        left = self._build(start, start + mid)
+        right = self._build(start + mid, end)
+        self.nodes[node_id] = (start, end, dim, split, left, right)
+        return node_id
+
+    def query(self, point, k):
+        """Return ``(chord_distances, indices)`` of the ``k`` nearest points."""
+        k = min(k, len(self.points))
+        if k <= 0:
+            return np.empty(0), np.empty(0, dtype=int)
+        point = np.asarray(point, dtype=float)
+        best_d2 = np.empty(0)
+        best_idx = np.empty(0, dtype=int)
+        worst = np.inf
+        heap = [(0.0, 0)]
+        while heap:
+            bound, node_id = heapq.heappop(heap)
+            if bound > worst:
+                break
+            start, end, dim, split, left, right = self.nodes[node_id]
+            if dim < 0:
+                d2 = ((self.points[start:end] - point) ** 2).sum(axis=1)
+                best_d2 = np.concatenate([best_d2, d2])
+                best_idx = np.concatenate([best_idx, np.arange(start, end)])
+                if len(best_d2) > k:
+                    keep = np.argpartition(best_d2, k - 1)[:k]
+                    best_d2, best_idx = best_d2[keep], best_idx[keep]
+                if len(best_d2) == k:
+                    worst = best_d2.max()
+                continue
+            diff = point[dim] - split
+            near, far = (left, right) if diff < 0 else (right, left)
+            heapq.heappush(heap, (bound, near))
+            heapq.heappush(heap, (max(bound, diff * diff), far))
+        order = np.argsort(best_d2, kind='stable')
+        return np.sqrt(best_d2[order]), self.order[best_idx[order]]
+
+    def query_radius(self, point, radius):
+        """Return ``(chord_distances, indices)`` of points within chord ``radius``, nearest first."""
+        if not len(self.points):
+            return np.empty(0), np.empty(0, dtype=int)
+        point = np.asarray(point, dtype=float)
+        r2 = radius * radius
+        found_d2 = []
+        found_idx = []
+        stack = [0]
+        while stack:
+            start, end, dim, split, left, right = self.nodes[stack.pop()]
+            if dim < 0:
+                d2 = ((self.points[start:end] - point) ** 2).sum(axis=1)
+                hit = np.nonzero(d2 <= r2)[0]
+                if len(hit):
+                    found_d2.append(d2[hit])
+                    found_idx.append(hit + start)
+                continue
+            diff = point[dim] - split
+            near, far = (left, right) if diff < 0 else (right, left)
+            stack.append(near)
+            if diff * diff <= r2:
+                stack.append(far)
+        if not found_d2:
+            return np.empty(0), np.empty(0, dtype=int)
+        d2 = np.concatenate(found_d2)
+        idx = np.concatenate(found_idx)
+        order = np.argsort(d2, kind='stable')
+        return np.sqrt(d2[order]), self.order[idx[order]]
+
+
+class PlantSpatialIndex:
+    """KD-tree over every plant that has usable coordinates."""
+
+    def __init__(self, plants):
+        self.plants = [p for p in plants if p['lat'] is not None and p['lon'] is not None]
+        self.tree = KDTree(to_unit_vectors([p['lat'] for p in self.plants],
+                                           [p['lon'] for p in self.plants]))
+
+    def _results(self, chords, indices):
+        return [dict(self.plants[i], distance_km=round(float(km), 3))
+                for km, i in zip(chord_to_km(chords), indices)]
+
+    def nearest(self, lat, lon, k):
+        return self._results(*self.tree.query(to_unit_vectors(lat, lon), k))
+
+    def within(self, lat, lon, radius_km):
+        return self._results(*self.tree.query_radius(to_unit_vectors(lat, lon), float(km_to_chord(radius_km))))
+
+
+def points_in_polygon(x, y, rings, max_cells=1_000_000):
+    """Even-odd point-in-polygon test for arrays of points.
+
+    ``rings`` are closed ``(n, 2)`` arrays of ``(x, y)``; holes and the
+    parts of a multi-polygon are simply more rings. Points are tested
+    against all edges of a ring at once, in chunks of ``max_cells``.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    inside = np.zeros(len(x), dtype=bool)
+    for ring in rings:
+        x1, y1 = ring[None, :-1, 0], ring[None, :-1, 1]
+        x2, y2 = ring[None, 1:, 0], ring[None, 1:, 1]
+        rows = max(1, max_cells // max(len(ring), 1))
+        for start in range(0, len(x), rows):
+            px, py = x[start:start + rows, None], y[start:start + rows, None]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                crosses = ((y1 > py) != (y2 > py)) & (px < (x2 - x1) * (py - y1) / (y2 - y1) + x1)
+            inside[start:start + rows] ^= np.count_nonzero(crosses, axis=1) % 2 == 1
+    return inside
+
+
+def distance_matrix_blocks(origins, destinations, factor=1.0, max_cells=250_000):
+    """Yield the origins x destinations haversine matrix in row blocks.
+
+    ``origins`` and ``destinations`` are ``(n, 2)`` arrays of lat/lon in
+    degrees. Each block holds as many full rows as fit in ``max_cells``,
+    so memory stays bounded however large the inputs are.
+    """
+    origins = np.asarray(origins, dtype=float).reshape(-1, 2)
+    destinations = np.asarray(destinations, dtype=float).reshape(-1, 2)
+    rows = max(1, max_cells // max(len(destinations), 1))
+    dest_lat = destinations[None, :, 0]
+    dest_lon = destinations[None, :, 1]
+    for start in range(0, len(origins), rows):
+        block = origins[start:start + rows]
+        yield factor * haversine_km(block[:, 0, None], block[:, 1, None], dest_lat, dest_lon)
@@ -0,0 +1,146 @@
+"""Cached, rate-limited geocoding through Nominatim.
+
+Results (including "not found") are kept in a SQLite file shared by all
+worker processes, expire after a TTL and are evicted least-recently-used
+once the cache is full. Network lookups are spaced at least
+``min_interval`` seconds apart across every process using the same
+cache file (Nominatim allows one request per second), and concurrent
+lookups of the same place in one process share a single request.
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+import requests
+
+NOMINATIM_URL = os.environ.get('NOMINATIM_URL', 'https://nominatim.openstreetmap.org/search')
+USER_AGENT = 'biomass-map-app'  # Nominatim requires a user agent
+
+
+def normalize_query(query):
+    return re.sub(r'\s+', ' ', str(query)).strip().lower()
+
+
+class GeocodeCache:
+    """SQLite-backed ``query -> (lat, lon)`` cache with TTL and LRU eviction."""
+
+    def __init__(self, path, ttl=90 * 86400, max_entries=50000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False,
+                                   isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS geocode ('
+                         'query TEXT PRIMARY KEY, lat REAL, lon REAL, '
+                         'fetched_at REAL NOT NULL, used_at REAL NOT NULL)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS geocode_used_at ON geocode (used_at)')
+        self._db.execute('CREATE TABLE IF NOT EXISTS throttle ('
+                         'id INTEGER PRIMARY KEY CHECK (id = 0), next_at REAL NOT NULL)')
+
+    def get(self, query):
+        """Return ``(found, lat, lon)``; ``found`` is False on a miss or expiry."""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute('SELECT lat, lon, fetched_at FROM geocode WHERE query = ?',
+                                   (query,)).fetchone()
+            if row is None or now - row[2] > self.ttl:
+                return False, None, None
+            self._db.execute('UPDATE geocode SET used_at = ? WHERE query = ?', (now, query))
+        return True, row[0], row[1]
+
+    def put(self, query, lat, lon):
+        now = time.time()
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO geocode VALUES (?, ?, ?, ?, ?)',
+                             (query, lat, lon, now, now))
+            count = self._db.execute('SELECT COUNT(*) FROM geocode').fetchone()[0]
+            if count > self.max_entries:
+                self._db.execute('DELETE FROM geocode WHERE query IN (SELECT query FROM geocode '
+                                 'ORDER BY used_at LIMIT ?)', (count - self.max_entries,))
+
+    def reserve_slot(self, min_interval):
+        """Claim the next network slot; returns seconds to wait before using it."""
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._db.execute('SELECT next_at FROM throttle WHERE id = 0').fetchone()
+                now = time.time()
+                start = max(now, row[0] if row else 0.0)
+                self._db.execute('INSERT OR REPLACE INTO throttle VALUES (0, ?)',
+                                 (start + min_interval,))
+                self._db.execute('COMMIT')
+            except Exception:
+                self._db.execute('ROLLBACK')
+                raise
+        return start - now
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM geocode').fetchone()[0]
+
+
+class Geocoder:
+    """Looks places up in the cache first and in Nominatim only on a miss."""
+
+    def __init__(self, cache, min_interval=1.0, timeout=(3.05, 10), session=None, observer=None):
+        self.cache = cache
+        self.min_interval = min_interval
+        self.timeout = timeout
+        self.session = session or requests
+        # Called as observer(seconds, ok) after every Nominatim request.
+        self.observer = observer
+        self.hits = 0
+        self.misses = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def _fetch(self, query):
+        wait = self.cache.reserve_slot(self.min_interval)
+        if wait > 0:
+            time.sleep(wait)
+        start = time.perf_counter()
+        try:
+            response = self.session.get(NOMINATIM_URL, params={'q': query, 'format': 'json'},
+                                        headers={'User-Agent': USER_AGENT}, timeout=self.timeout)
+            response.raise_for_status()
+        except Exception:
+            if self.observer is not None:
+                self.observer(time.perf_counter() - start, False)
+            raise
+        if self.observer is not None:
+            self.observer(time.perf_counter() - start, True)
+        data = response.json()
+        if data:
+            return float(data[0]['lat']), float(data[0]['lon'])
+        return None, None
+
+    def lookup(self, query):
+        """Return ``(lat, lon)`` for ``query`` or ``(None, None)`` if unknown."""
+        key = normalize_query(query)
+        found, lat, lon = self.cache.get(key)
+        if found:
+            self.hits += 1
+            return lat, lon
+        self.misses += 1
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+        if not leader:
+            return future.result()
+        try:
+            lat, lon = self._fetch(key)
+            self.cache.put(key, lat, lon)
+            future.set_result((lat, lon))
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+        return lat, lon
@@ -0,0 +1,317 @@
+"""Multi-resolution boundary geometry for the map.
+
+The raw boundary files carry every vertex at 14 decimal places, which
+is far more than any zoom level can show. Each file is turned into a
+topology once: rings are cut into arcs at the points where neighbouring
+polygons meet, shared arcs are stored once, and every arc vertex gets a
+Douglas-Peucker significance. A detail level is then just a threshold
+on that significance, so adjacent districts are always simplified
+identically and never open gaps or overlaps between them.
+
+Every (file, detail, format) is built on first use and kept as a
+pre-compressed response.
+"""
+import os
+import threading
+
+import numpy as np
+
+from responses import PrecompressedJSON
+
+# Simplification tolerance in degrees (0 keeps every vertex).
+DETAIL_TOLERANCES = {'low': 0.02, 'medium': 0.005, 'high': 0.001, 'full': 0.0}
+# TopoJSON quantization grid size and GeoJSON decimal places per level.
+DETAIL_QUANTIZATION = {'low': 10_000, 'medium': 100_000, 'high': 100_000, 'full': 1_000_000}
+DETAIL_DECIMALS = {'low': 3, 'medium': 4, 'high': 5, 'full': 6}
+FORMATS = ('geojson', 'topojson')
+
+# Vertices are snapped to this grid so shared borders match exactly.
+SNAP = 1e6
+
+
+def detail_for_zoom(zoom):
+    """Lightest detail level that still looks right at a web-map zoom level."""
+    if zoom <= 5:
+        return 'low'
+    if zoom <= 7:
+        return 'medium'
+    if zoom <= 9:
+        return 'high'
+    return 'full'
+
+
+def _significance(points):
+    """Douglas-Peucker significance of every vertex of an open polyline.
+
+    A vertex survives simplification at tolerance ``t`` iff its value is
+    greater than ``t``. Values never exceed the parent split, so lower
+    tolerances always keep a superset of the vertices.
+    """
+    n = len(points)
+    sig = np.zeros(n)
+    sig[0] = sig[-1] = np.inf
+    stack = [(0, n - 1, np.inf)]
+    while stack:
+        i, j, parent = stack.pop()
+        if j - i < 2:
+            continue
+        seg = points[i + 1:j]
+        a, b = points[i], points[j]
+        ab = b - a
+        length = np.hypot(*ab)
+        if length == 0:
+            d = np.hypot(*(seg - a).T)
+        else:
+            d = np.abs(ab[0] * (seg[:, 1] - a[1]) - ab[1] * (seg[:, 0] - a[0])) / length
+        k = int(np.argmax(d))
+        value = min(float(d[k]), parent)
+        sig[i + 1 + k] = value
+        stack.append((i, i + 1 + k, value))
+        stack.append((i + 1 + k, j, value))
+    return sig
+
+
+class Topology:
+    """Arc topology of one GeoJSON FeatureCollection."""
+
+    def __init__(self, name, collection):
+        self.name = name
+        self.features = []
+        rings = []
+        for feature in collection.get('features', []):
+            geometry = feature.get('geometry') or {}
+            if geometry.get('type') == 'Polygon':
+                polygons = [geometry['coordinates']]
+            elif geometry.get('type') == 'MultiPolygon':
+                polygons = geometry['coordinates']
+            else:
+                polygons = []
+            shape = []
+            for polygon in polygons:
+                ring_ids = []
+                for ring in polygon:
+                    pts = [(round(x * SNAP), round(y * SNAP)) for x, y in ring]
+                    if len(pts) > 1 and pts[0] == pts[-1]:
+                        pts.pop()
+                    if len(pts) >= 3:
+                        ring_ids.append(len(rings))
+                        rings.append(pts)
+                if ring_ids:
+                    shape.append(ring_ids)
+            self.features.append((feature.get('properties') or {}, shape))
+        self._build_arcs(rings)
+
+    def _build_arcs(self, rings):
+        # A vertex is a junction when rings pass through it with different neighbours.
+        junction = object()
+        seen = {}
+        for pts in rings:
+            n = len(pts)
+            for i, p in enumerate(pts):
+                a, b = pts[i - 1], pts[(i + 1) % n]
+                pair = (a, b) if a < b else (b, a)
+                prev = seen.get(p)
+                if prev is None:
+                    seen[p] = pair
+                elif prev is not junction and prev != pair:
+                    seen[p] = junction
+
+        arcs, index = [], {}
+        self.ring_arcs = []
+        min_points = []
+        for pts in rings:
+            cuts = [i for i, p in enumerate(pts) if seen[p] is junction]
+            if cuts:
+                pts = pts[cuts[0]:] + pts[:cuts[0]]
+                cuts = [c - cuts[0] for c in cuts] + [len(pts)]
+                pieces = [pts[s:e] + [pts[e % len(pts)]] for s, e in zip(cuts, cuts[1:])]
+            else:
+                start = pts.index(min(pts))
+                pts = pts[start:] + pts[:start]
+                pieces = [pts + [pts[0]]]
+            # Keep enough vertices that no ring collapses below a triangle.
+            need = 4 if len(pieces) == 1 else 3 if len(pieces) == 2 else 2
+            refs = []
+            for piece in pieces:
+                key = tuple(piece)
+                if key in index:
+                    ref = index[key]
+                elif key[::-1] in index:
+                    ref = ~index[key[::-1]]
+                else:
+                    ref = index[key] = len(arcs)
+                    arcs.append(np.array(piece, dtype=np.int64))
+                    min_points.append(2)
+                arc_id = ref if ref >= 0 else ~ref
+                min_points[arc_id] = max(min_points[arc_id], need)
+                refs.append(ref)
+            self.ring_arcs.append(refs)
+
+        self.arcs = arcs
+        self.significance = [_significance(arc / SNAP) for arc in arcs]
+        self.min_points = min_points
+
+    def simplified_arcs(self, tolerance):
+        """Return every arc as an ``(n, 2)`` array of degrees at ``tolerance``."""
+        result = []
+        for arc, sig, need in zip(self.arcs, self.significance, self.min_points):
+            keep = sig > tolerance
+            if keep.sum() < need:
+                keep[np.argsort(-sig, kind='stable')[:need]] = True
+            result.append(arc[keep] / SNAP)
+        return result
+
+    def _ring(self, arcs, ring_id):
+        parts = []
+        for ref in self.ring_arcs[ring_id]:
+            arc = arcs[ref] if ref >= 0 else arcs[~ref][::-1]
+            parts.append(arc[1:] if parts else arc)
+        return np.concatenate(parts)
+
+    def feature_polygons(self, arcs):
+        """Yield ``(properties, polygons)`` with rings as closed ``(n, 2)`` arrays."""
+        for properties, shape in self.features:
+            yield properties, [[self._ring(arcs, r) for r in polygon] for polygon in shape]
+
+    def geojson(self, detail):
+        arcs = self.simplified_arcs(DETAIL_TOLERANCES[detail])
+        decimals = DETAIL_DECIMALS[detail]
+        features = []
+        for properties, polygons in self.feature_polygons(arcs):
+            polygons = [[np.round(ring, decimals).tolist() for ring in polygon] for polygon in polygons]
+            if not polygons:
+                geometry = None
+            elif len(polygons) == 1:
+                geometry = {'type': 'Polygon', 'coordinates': polygons[0]}
+            else:
+                geometry = {'type': 'MultiPolygon', 'coordinates': polygons}
+            features.append({'type': 'Feature', 'properties': properties, 'geometry': geometry})
+        return {'type': 'FeatureCollection', 'features': features}
+
+    def topojson(self, detail):
+        arcs = self.simplified_arcs(DETAIL_TOLERANCES[detail])
+        q = DETAIL_QUANTIZATION[detail]
+        stacked = np.concatenate(arcs) if arcs else np.zeros((1, 2))
+        lo, hi = stacked.min(axis=0), stacked.max(axis=0)
+        scale = np.where(hi > lo, (hi - lo) / (q - 1), 1.0)
+        encoded = []
+        for arc in arcs:
+            quantized = np.round((arc - lo) / scale).astype(np.int64)
+            # Drop vertices that quantize onto their predecessor, keeping both ends.
+            keep = np.ones(len(quantized), dtype=bool)
+            keep[1:] = np.any(quantized[1:] != quantized[:-1], axis=1)
+            keep[-1] = True
+            quantized = quantized[keep]
+            deltas = np.vstack([quantized[:1], np.diff(quantized, axis=0)])
+            encoded.append(deltas.tolist())
+
+        geometries = []
+        for properties, shape in self.features:
+            polygons = [[self.ring_arcs[r] for r in polygon] for polygon in shape]
+            if not polygons:
+                geometries.append({'type': None, 'properties': properties})
+            elif len(polygons) == 1:
+                geometries.append({'type': 'Polygon', 'properties': properties, 'arcs': polygons[0]})
+            else:
+                geometries.append({'type': 'MultiPolygon', 'properties': properties, 'arcs': polygons})
+        return {
+            'type': 'Topology',
+            'transform': {'scale': scale.tolist(), 'translate': lo.tolist()},
+            'objects': {self.name: {'type': 'GeometryCollection', 'geometries': geometries}},
+            'arcs': encoded,
+        }
+
+
+class GeometryStore:
+    """Builds and memoizes simplified responses for the files under ``root``.
+
+    Entries are keyed by path and modification time; when a file changes,
+    the entries of its previous version are dropped. Builds run outside
+    the store's lock, so a slow file does not hold up the others, and
+    concurrent requests for the same entry wait for one build.
+    """
+
+    def __init__(self, root, loads):
+        self.root = root
+        self._loads = loads
+        self._topologies = {}
+        self._responses = {}
+        self._building = {}  # key -> Event set when its build finishes
+        self._lock = threading.Lock()
+
+    def path(self, filename):
+        path = os.path.realpath(os.path.join(self.root, filename))
+        if not path.startswith(os.path.realpath(self.root) + os.sep) or not path.endswith('.json'):
+            return None
+        return path if os.path.isfile(path) else None
+
+    def _memoized(self, cache, key, build, store):
+        """Return ``cache[key]``, building it once with ``build()`` and saving it with ``store``."""
+        while True:
+            with self._lock:
+                if key in cache:
+                    return cache[key]
+                event = self._building.get(key)
+                owner = event is None
+                if owner:
+                    event = self._building[key] = threading.Event()
+            if owner:
+                break
+            # Another thread is building it; if that build fails, retry ours.
+            event.wait()
+        try:
+            value = build()
+            with self._lock:
+                store(key, value)
+            return value
+        finally:
+            with self._lock:
+                del self._building[key]
+            event.set()
+
+    def _store_topology(self, key, topology):
+        path = key[0]
+        for old in [k for k in self._topologies if k[0] == path and k != key]:
+            del self._topologies[old]
+        for old in [k for k in self._responses if k[0][0] == path and k[0] != key]:
+            del self._responses[old]
+        self._topologies[key] = topology
+
+    def _store_response(self, key, response):
+        # Not if the file changed (and its topology was replaced) meanwhile.
+        if key[0] in self._topologies:
+            self._responses[key] = response
+
+    def topology(self, filename):
+        """Return the Topology of ``filename`` (relative to the root), or None."""
+        path = self.path(filename)
+        if path is None:
+            return None
+        return self._topology(path)[0]
+
+    def _topology(self, path):
+        key = (path, os.stat(path).st_mtime_ns)
+
+        def build():
+            with open(path, 'rb') as f:
+                collection = self._loads(f.read())
+            return Topology(os.path.splitext(os.path.basename(path))[0], collection)
+        return self._memoized(self._topologies, key, build, self._store_topology), key
+
+    def get(self, filename, detail, fmt):
+        """Return the PrecompressedJSON for one file, or None if it does not exist."""
+        path = self.path(filename)
+        if path is None:
+            return None
+        topology, key = self._topology(path)
+
+        def build():
+            document = topology.topojson(detail) if fmt == 'topojson' else topology.geojson(detail)
+            return PrecompressedJSON(document)
+        return self._memoized(self._responses, (key, detail, fmt), build, self._store_response)
+
+    def files(self):
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in sorted(filenames):
+                if filename.endswith('.json'):
+                    yield os.path.relpath(os.path.join(dirpath, filename), self.root)
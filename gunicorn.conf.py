@@ -0,0 +1,56 @@
+"""Production server settings: ``gunicorn -c gunicorn.conf.py``.
+
+The app is imported once in the master (``preload_app``), where
+``wsgi.py`` builds every dataset, index and boundary response before
+any worker exists. Workers are forked from that process and share those
+pages copy-on-write, so each extra worker costs little more than its own
+interpreter state, and a worker (including one restarted after a crash
+or ``max_requests``) serves its first request without loading anything.
+
+To keep the shared pages clean, the cyclic GC is disabled while loading
+and everything alive at fork time is moved to the permanent generation
+with ``gc.freeze()``; otherwise the first collection in every worker
+would write to the header of every loaded object and copy the whole
+heap. The registry still reloads a dataset whose sources change, but
+only in the workers that notice, and that copy is private to them.
+"""
+import gc
+import glob
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', f"0.0.0.0:{os.environ.get('PORT', 10000)}")
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+# Recycle workers now and then; a fresh fork of the master is ready at once.
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG') or None
+
+wsgi_app = 'wsgi:app'
+preload_app = True
+
+# Objects created by the preload must not be collected (and their memory
+# reused) between here and the freeze, or the holes they leave get
+# refilled after the fork in every worker.
+gc.disable()
+
+
+def on_starting(server):
+    """Drop metric snapshots left by a previous server (see metrics.py)."""
+    directory = os.environ.get('METRICS_DIR')
+    if not directory:
+        return
+    for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+        try:
+            os.unlink(path)
+        except OSError as e:
+            print(f"Error removing {path}: {str(e)}")
+
+
+def when_ready(server):
+    """Runs in the master after the preload, before the first fork."""
+    gc.freeze()
+    gc.enable()
+    server.log.info("Preloaded app; %d objects frozen for the workers", gc.get_freeze_count())
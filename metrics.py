@@ -0,0 +1,204 @@
+"""Counters and histograms exposed in the Prometheus text format.
+
+Every process keeps its own values in memory. With a shared
+``directory`` each process also writes a snapshot of them to
+``metrics-<pid>.json`` (at most once per ``flush_interval`` and at
+exit), and ``render()`` sums the snapshots of all processes, so any
+gunicorn worker can answer a scrape for the whole server. Snapshots of
+exited workers are kept, which keeps counters monotonic; clear the
+directory when the server starts.
+
+A process that forks (gunicorn ``preload_app``) flushes first and its
+children start from zero, so nothing recorded before the fork is
+counted twice.
+"""
+import atexit
+import functools
+import glob
+import json
+import os
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _label_text(labels):
+    escape = lambda v: str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return ','.join(f'{k}="{escape(v)}"' for k, v in labels)
+
+
+def _number(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    def __init__(self, registry, name, help):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.registry.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+        self.registry.maybe_flush()
+
+
+class Histogram:
+    def __init__(self, registry, name, help, buckets=DEFAULT_BUCKETS):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.values = {}  # labels -> [count per bucket (+Inf last), sum]
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.registry.lock:
+            series = self.values.get(key)
+            if series is None:
+                series = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    break
+            else:
+                i = len(self.buckets)
+            series[i] += 1
+            series[-1] += value
+        self.registry.maybe_flush()
+
+    def time(self, **labels):
+        """Decorator recording the duration of each call (errors included)."""
+        def decorate(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - start, **labels)
+            return wrapper
+        return decorate
+
+
+class Metrics:
+    """A set of metrics, optionally aggregated across processes through ``directory``."""
+
+    def __init__(self, directory=None, flush_interval=1.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self._metrics = {}
+        self._collectors = []
+        self._flushed_at = 0.0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            atexit.register(self.flush)
+            os.register_at_fork(before=self.flush, after_in_child=self._reset)
+
+    def counter(self, name, help):
+        return self._metrics.setdefault(name, Counter(self, name, help))
+
+    def histogram(self, name, help, buckets=DEFAULT_BUCKETS):
+        return self._metrics.setdefault(name, Histogram(self, name, help, buckets))
+
+    def collector(self, func):
+        """Register ``func() -> [(name, help, labels, value)]`` of cumulative counts."""
+        self._collectors.append(func)
+        return func
+
+    def _reset(self):
+        self.lock = threading.Lock()
+        for metric in self._metrics.values():
+            metric.values = {}
+        self._flushed_at = 0.0
+
+    def snapshot(self):
+        """This process's values as a JSON-able dict."""
+        with self.lock:
+            result = {}
+            for name, metric in self._metrics.items():
+                entry = {'help': metric.help, 'samples': [[list(map(list, k)), v]
+                                                          for k, v in metric.values.items()]}
+                if isinstance(metric, Histogram):
+                    entry['type'] = 'histogram'
+                    entry['buckets'] = list(metric.buckets)
+                else:
+                    entry['type'] = 'counter'
+                result[name] = entry
+        for collect in self._collectors:
+            for name, help, labels, value in collect():
+                entry = result.setdefault(name, {'type': 'counter', 'help': help, 'samples': []})
+                entry['samples'].append([sorted(map(list, labels.items())), value])
+        return result
+
+    def maybe_flush(self):
+        if self.directory and time.monotonic() - self._flushed_at >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if not self.directory:
+            return
+        self._flushed_at = time.monotonic()
+        path = os.path.join(self.directory, f'metrics-{os.getpid()}.json')
+        tmp = f'{path}.{threading.get_ident()}.tmp'
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"Error writing metrics: {str(e)}")
+
+    def _snapshots(self):
+        if not self.directory:
+            return [self.snapshot()]
+        own = os.path.join(self.directory, f'metrics-{os.getpid()}.json')
+        snapshots = [self.snapshot()]
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            if path == own:
+                continue
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def render(self):
+        """All metrics of all processes in the Prometheus text exposition format."""
+        merged = {}
+        for snapshot in self._snapshots():
+            for name, entry in snapshot.items():
+                target = merged.setdefault(name, {**entry, 'samples': {}})
+                for labels, value in entry['samples']:
+                    key = tuple(map(tuple, labels))
+                    if entry['type'] == 'histogram':
+                        current = target['samples'].get(key)
+                        target['samples'][key] = (value if current is None
+                                                  else [a + b for a, b in zip(current, value)])
+                    else:
+                        target['samples'][key] = target['samples'].get(key, 0) + value
+
+        lines = []
+        for name in sorted(merged):
+            entry = merged[name]
+            lines.append(f"# HELP {name} {entry['help']}")
+            lines.append(f"# TYPE {name} {entry['type']}")
+            for key in sorted(entry['samples']):
+                value = entry['samples'][key]
+                if entry['type'] != 'histogram':
+                    lines.append(f'{name}{{{_label_text(key)}}} {_number(value)}' if key
+                                 else f'{name} {_number(value)}')
+                    continue
+                cumulative = 0
+                bounds = [_number(b) for b in entry['buckets']] + ['+Inf']
+                for bound, count in zip(bounds, value[:-1]):
+                    cumulative += count
+                    labels = _label_text(key + (('le', bound),))
+                    lines.append(f'{name}_bucket{{{labels}}} {cumulative}')
+                suffix = f'{{{_label_text(key)}}}' if key else ''
+                lines.append(f'{name}_sum{suffix} {_number(value[-1])}')
+                lines.append(f'{name}_count{suffix} {cumulative}')
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,112 @@
+"""Sampling profiler for single requests, with flame-graph output.
+
+``StackSampler`` runs a background thread that records the stack of
+one target thread every ``interval`` seconds via ``sys._current_frames``.
+It needs nothing outside the standard library, sees time spent in any
+function (loaders, ``jsonify``, socket waits), and costs the profiled
+request only the brief GIL hand-offs of the sampler thread.
+
+Samples are written either in the collapsed-stack format used by
+``flamegraph.pl`` (``a;b;c 12``) or as a speedscope JSON file; both
+open directly in https://www.speedscope.app.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+SPEEDSCOPE_SCHEMA = 'https://www.speedscope.app/file-format-schema.json'
+FORMATS = {'speedscope': '.speedscope.json', 'collapsed': '.collapsed.txt'}
+
+
+class StackSampler:
+    """Samples the stack of ``thread_id`` (default: the calling thread)."""
+
+    def __init__(self, thread_id=None, interval=0.001):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.samples = []  # (stack root-first, seconds)
+        self._stop = threading.Event()
+        self._thread = None
+        self.started_at = self.duration = None
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration = time.perf_counter() - self.started_at
+        return self.samples
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is None:
+                break
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            self.samples.append((tuple(reversed(stack)), now - last))
+            last = now
+
+
+def _label(frame):
+    name, filename, line = frame
+    return f'{name} ({os.path.basename(filename)}:{line})'
+
+
+def write_collapsed(path, samples):
+    """One ``frame;frame;frame count`` line per distinct stack."""
+    counts = Counter(';'.join(_label(f) for f in stack) for stack, _ in samples)
+    with open(path, 'w') as f:
+        for stack, count in counts.most_common():
+            f.write(f'{stack} {count}\n')
+
+
+def write_speedscope(path, samples, name):
+    """A speedscope "sampled" profile weighted by the real time between samples."""
+    frames, index = [], {}
+    stacks = []
+    for stack, _ in samples:
+        ids = []
+        for frame in stack:
+            if frame not in index:
+                index[frame] = len(frames)
+                frames.append({'name': frame[0], 'file': frame[1], 'line': frame[2]})
+            ids.append(index[frame])
+        stacks.append(ids)
+    weights = [seconds for _, seconds in samples]
+    document = {
+        '$schema': SPEEDSCOPE_SCHEMA,
+        'name': name,
+        'shared': {'frames': frames},
+        'profiles': [{'type': 'sampled', 'name': name, 'unit': 'seconds', 'startValue': 0,
+                      'endValue': sum(weights), 'samples': stacks, 'weights': weights}],
+    }
+    with open(path, 'w') as f:
+        json.dump(document, f)
+
+
+def write_profile(directory, name, samples, fmt='speedscope'):
+    """Write ``samples`` under ``directory``; returns the file path."""
+    os.makedirs(directory, exist_ok=True)
+    safe = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in name).strip('_')
+    now = time.time()
+    stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(now)) + f'.{int(now * 1000) % 1000:03d}'
+    path = os.path.join(directory, f'{stamp}-{os.getpid()}-{threading.get_ident()}-{safe[:80]}{FORMATS[fmt]}')
+    if fmt == 'collapsed':
+        write_collapsed(path, samples)
+    else:
+        write_speedscope(path, samples, name)
+    return path
@@ -0,0 +1,77 @@
+"""Versioned response cache for the per-state and per-district endpoints.
+
+``ResponseCache.view(version)`` caches a view's body in any Flask-Caching
+backend (SimpleCache per process, FileSystemCache or RedisCache shared
+by all workers). The key is the request path, the sorted query string
+and ``version(**view_args)``: a token of the data the response was built
+from, usually the registry stamp of the datasets it reads. Reloading a
+workbook changes the token of exactly the responses that used it, so
+they miss and are rebuilt; the stale entries are never read again and
+age out with the backend's timeout.
+"""
+import functools
+import hashlib
+import threading
+from urllib.parse import urlencode
+
+from flask import Response, make_response, request
+
+
+class ResponseCache:
+    """Caches 200 responses of decorated views in ``cache`` (a ``flask_caching.Cache``)."""
+
+    def __init__(self, cache, timeout=None):
+        self.cache = cache
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def key(self, token):
+        query = urlencode(sorted(request.args.items(multi=True)))
+        digest = hashlib.sha1(repr(token).encode()).hexdigest()[:16]
+        return f'view:{request.path}?{query}@{digest}'
+
+    def view(self, version):
+        """Decorator; ``version(**view_args)`` returns a token of the data the view reads."""
+        def decorate(func):
+            @functools.wraps(func)
+            def wrapper(**kwargs):
+                key = self.key(version(**kwargs))
+                try:
+                    cached = self.cache.get(key)
+                except Exception as e:
+                    # A cache outage costs speed, not availability.
+                    print(f"Error reading response cache: {str(e)}")
+                    self._count('errors')
+                    cached = None
+                if cached is not None:
+                    self._count('hits')
+                    body, mimetype = cached
+                    return Response(body, mimetype=mimetype, headers={'X-Cache': 'HIT'})
+                self._count('misses')
+                response = make_response(func(**kwargs))
+                if response.status_code == 200 and not response.is_streamed:
+                    try:
+                        self.cache.set(key, (response.get_data(), response.mimetype), timeout=self.timeout)
+                    except Exception as e:
+                        print(f"Error writing response cache: {str(e)}")
+                        self._count('errors')
+                response.headers['X-Cache'] = 'MISS'
+                return response
+            return wrapper
+        return decorate
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'errors': self.errors,
+            'hit_ratio': round(self.hits / total, 4) if total else None,
+        }
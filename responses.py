@@ -0,0 +1,65 @@
+"""Pre-serialized, pre-compressed JSON responses for the bulk endpoints.
+
+A ``PrecompressedJSON`` is built once per data version: the body is
+encoded once with orjson and compressed once with gzip
+and, when the ``brotli`` module is installed, brotli. Serving it picks
+the best encoding the client accepts, answers ``If-None-Match`` with
+304 and never re-encodes anything.
+"""
+import gzip
+import hashlib
+
+import orjson
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:  # optional: gzip is always available
+    brotli = None
+
+CACHE_CONTROL = 'public, no-cache'
+
+
+def dumps(value, default=None):
+    """Encode ``value`` as compact UTF-8 JSON with sorted keys, like jsonify.
+
+    NaN and infinities become ``null``, so the output is always valid JSON.
+    """
+    return orjson.dumps(value, default=default, option=orjson.OPT_SORT_KEYS
+                        | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+class PrecompressedJSON:
+    """One JSON document held as identity, gzip and brotli bytes with strong ETags."""
+
+    def __init__(self, value, default=None):
+        body = dumps(value, default)
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        # Each encoding is a distinct representation, so each gets its own strong ETag.
+        self.variants = {None: (body, digest)}
+        self.variants['gzip'] = (gzip.compress(body, 9, mtime=0), f'{digest}-gz')
+        if brotli is not None:
+            self.variants['br'] = (brotli.compress(body, quality=9), f'{digest}-br')
+
+    def _encoding(self):
+        for coding in ('br', 'gzip'):
+            if coding in self.variants and request.accept_encodings[coding]:
+                return coding
+        return None
+
+    def not_modified(self):
+        """True if the client already holds any representation of this document."""
+        if_none_match = request.if_none_match
+        return bool(if_none_match) and (
+            if_none_match.star_tag
+            or any(if_none_match.contains(etag) for _, etag in self.variants.values()))
+
+    def response(self, status=200):
+        encoding = self._encoding()
+        body, etag = self.variants[encoding]
+        headers = {'ETag': f'"{etag}"', 'Cache-Control': CACHE_CONTROL, 'Vary': 'Accept-Encoding'}
+        if self.not_modified():
+            return Response(status=304, headers=headers)
+        if encoding:
+            headers['Content-Encoding'] = encoding
+        return Response(body, status=status, headers=headers, mimetype='application/json')
@@ -0,0 +1,152 @@
+"""Offline driving-distance engine over a preprocessed road graph.
+
+The graph is a compressed adjacency array (CSR) stored in an ``.npz``
+file with these arrays:
+
+* ``lat``, ``lon`` -- node coordinates in degrees
+* ``indptr``, ``indices`` -- outgoing edges of node ``i`` are
+  ``indices[indptr[i]:indptr[i + 1]]``
+* ``weights`` -- edge lengths in metres, parallel to ``indices``
+
+``flask build-road-graph`` produces it from node and edge CSV exports of
+an OSM extract. Queries snap both points to the nearest graph node and
+run A* with a great-circle heuristic, which never overestimates a
+length-weighted road distance.
+"""
+import heapq
+import math
+
+import numpy as np
+import pandas as pd
+
+from geo import EARTH_RADIUS_KM, KDTree, haversine_km, to_unit_vectors
+
+
+ONEWAY_TRUE = frozenset(['yes', 'true', '1'])
+
+
+def parse_oneway(column):
+    """Boolean array of the edges marked one-way; ``no``, ``0``, ``-1`` and blanks are two-way."""
+    def is_oneway(value):
+        if isinstance(value, (bool, np.bool_)):
+            return bool(value)
+        if isinstance(value, (int, float, np.number)):
+            return value == 1
+        return str(value).strip().lower() in ONEWAY_TRUE
+    return np.fromiter((is_oneway(v) for v in column), dtype=bool, count=len(column))
+
+
+class RoadGraph:
+    """Shortest driving distances on a CSR road graph."""
+
+    def __init__(self, lat, lon, indptr, indices, weights, max_snap_km=10.0):
+        self.lat = np.asarray(lat, dtype=float)
+        self.lon = np.asarray(lon, dtype=float)
+        self.max_snap_km = max_snap_km
+        xyz = to_unit_vectors(self.lat, self.lon)
+        self.tree = KDTree(xyz)
+        # Plain lists: element access in the search loop is much cheaper than on ndarrays.
+        self._indptr = np.asarray(indptr, dtype=np.int64).tolist()
+        self._indices = np.asarray(indices, dtype=np.int64).tolist()
+        self._weights = np.asarray(weights, dtype=float).tolist()
+        self._x, self._y, self._z = (xyz[:, i].tolist() for i in range(3))
+        # Scale the heuristic down if any edge is shorter than the straight
+        # line between its ends, so it stays admissible on imperfect input.
+        src = np.repeat(np.arange(len(self.lat)), np.diff(indptr))
+        straight = haversine_km(self.lat[src], self.lon[src],
+                                self.lat[indices], self.lon[indices]) * 1000
+        ratios = np.asarray(weights, dtype=float)[straight > 0] / straight[straight > 0]
+        self._heuristic_scale = float(min(1.0, ratios.min())) if len(ratios) else 1.0
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        with np.load(path) as data:
+            return cls(data['lat'], data['lon'], data['indptr'], data['indices'],
+                       data['weights'], **kwargs)
+
+    def __len__(self):
+        return len(self.lat)
+
+    def snap(self, lat, lon):
+        """Return ``(node, km)`` of the nearest node, or ``(None, None)`` if too far."""
+        chords, nodes = self.tree.query(to_unit_vectors(lat, lon), 1)
+        if not len(nodes):
+            return None, None
+        km = 2 * EARTH_RADIUS_KM * math.asin(min(chords[0] / 2, 1.0))
+        if km > self.max_snap_km:
+            return None, None
+        return int(nodes[0]), km
+
+    def path_length(self, source, target):
+        """A* search; returns the shortest path length in metres or None."""
+        if source == target:
+            return 0.0
+        indptr, indices, weights = self._indptr, self._indices, self._weights
+        x, y, z = self._x, self._y, self._z
+        tx, ty, tz = x[target], y[target], z[target]
+        scale = 2 * EARTH_RADIUS_KM * 1000 * self._heuristic_scale
+        asin, sqrt = math.asin, math.sqrt
+
+        def h(n):
+            chord = sqrt((x[n] - tx) ** 2 + (y[n] - ty) ** 2 + (z[n] - tz) ** 2)
+            return scale * asin(min(chord / 2, 1.0))
+
+        best = {source: 0.0}
+        heap = [(h(source), 0.0, source)]
+        while heap:
+            _, g, u = heapq.heappop(heap)
+            if u == target:
+                return g
+            if g > best[u]:
+                continue
+            for i in range(indptr[u], indptr[u + 1]):
+                v = indices[i]
+                ng = g + weights[i]
+                if ng < best.get(v, math.inf):
+                    best[v] = ng
+                    heapq.heappush(heap, (ng + h(v), ng, v))
+        return None
+
+    def distance_km(self, lat1, lon1, lat2, lon2):
+        """Driving distance between two points, or None if off the network."""
+        source, snap1 = self.snap(lat1, lon1)
+        target, snap2 = self.snap(lat2, lon2)
+        if source is None or target is None:
+            return None
+        metres = self.path_length(source, target)
+        if metres is None:
+            return None
+        return snap1 + metres / 1000 + snap2
+
+
+def build(nodes_csv, edges_csv, output):
+    """Compile node/edge CSV exports into the ``.npz`` graph format.
+
+    ``nodes_csv`` needs ``id,lat,lon``; ``edges_csv`` needs ``from,to`` and
+    optionally ``length_m`` (great-circle length if absent) and ``oneway``
+    (edges are two-way unless it is ``yes``, ``true`` or ``1``).
+    """
+    nodes = pd.read_csv(nodes_csv)
+    edges = pd.read_csv(edges_csv)
+    node_ids = pd.Index(nodes['id'])
+    src = node_ids.get_indexer(edges['from'])
+    dst = node_ids.get_indexer(edges['to'])
+    if (src < 0).any() or (dst < 0).any():
+        raise ValueError('edges reference node ids missing from the nodes file')
+    lat = nodes['lat'].to_numpy(dtype=float)
+    lon = nodes['lon'].to_numpy(dtype=float)
+    if 'length_m' in edges:
+        length = edges['length_m'].to_numpy(dtype=float)
+    else:
+        length = haversine_km(lat[src], lon[src], lat[dst], lon[dst]) * 1000
+    oneway = parse_oneway(edges['oneway']) if 'oneway' in edges else np.zeros(len(edges), bool)
+    two_way = ~oneway
+    src, dst, length = (np.concatenate([src, dst[two_way]]),
+                        np.concatenate([dst, src[two_way]]),
+                        np.concatenate([length, length[two_way]]))
+    order = np.argsort(src, kind='stable')
+    indptr = np.zeros(len(lat) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=len(lat)), out=indptr[1:])
+    np.savez(output, lat=lat, lon=lon, indptr=indptr,
+             indices=dst[order].astype(np.int32), weights=length[order].astype(np.float32))
+    return len(lat), len(src)
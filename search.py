@@ -0,0 +1,102 @@
+"""Typo-tolerant plant search for the autocomplete.
+
+``PlantSearchIndex`` keeps, per field (plant name, city, state), a
+posting array of plant numbers for every trigram of the field's words,
+padded like pg_trgm ("  ab", " abc", "bc "). A query is split into the
+same trigrams, except that its last word gets no end padding because it
+is usually still being typed. Each query trigram found in a plant counts
+with the weight of the best field it occurs in, and the score is the
+weighted share of the query matched, so misspelt or partial words still
+score most of their trigrams. Exact prefix and substring matches of the
+name rank first; identical rows of the two workbooks are listed once.
+Only plants with a name, a city and coordinates are indexed, since a
+suggestion the distance calculator cannot use is no help.
+"""
+import re
+
+import numpy as np
+
+# Lowest weight first: a trigram found in several fields counts the last (best) one.
+FIELDS = (('state', 1.0), ('city', 1.5), ('name', 3.0))
+# Weighted share of the query's trigrams a plant must match to be returned.
+MIN_SCORE = 0.25
+_WORD = re.compile(r'[0-9a-z]+')
+
+
+def normalize(text):
+    return ' '.join(_WORD.findall(str(text).lower()))
+
+
+def trigrams(text, partial=False):
+    """Unique trigrams of ``text``; with ``partial`` the last word is treated as a prefix."""
+    words = normalize(text).split()
+    grams = set()
+    for i, word in enumerate(words):
+        padded = '  ' + word + ('' if partial and i == len(words) - 1 else ' ')
+        grams.update(padded[j:j + 3] for j in range(len(padded) - 2))
+    return grams
+
+
+def searchable(plant):
+    """True for plants that can be suggested: named, with a city and a location."""
+    located = all(plant.get(k) is not None and plant.get(k) == plant.get(k) for k in ('lat', 'lon'))
+    return located and bool(plant.get('name')) and bool(plant.get('city'))
+
+
+class PlantSearchIndex:
+    """Trigram index over ``name``, ``city`` and ``state`` of the plant table."""
+
+    def __init__(self, plants):
+        self.plants = [plant for plant in plants if searchable(plant)]
+        plants = self.plants
+        self.names = [normalize(p.get('name', '')) for p in plants]
+        self.postings = {}
+        for field, _ in FIELDS:
+            lists = {}
+            for number, plant in enumerate(plants):
+                for gram in trigrams(plant.get(field, '')):
+                    lists.setdefault(gram, []).append(number)
+            self.postings[field] = {gram: np.array(ids, dtype=np.int32) for gram, ids in lists.items()}
+
+    def __len__(self):
+        return len(self.plants)
+
+    def search(self, query, limit=10):
+        """Return up to ``limit`` ``(plant, score)`` pairs, best first."""
+        grams = trigrams(query, partial=not query[-1:].isspace())
+        if not grams or not self.plants:
+            return []
+        scores = np.zeros(len(self.plants))
+        gram_score = np.empty(len(self.plants))
+        for gram in grams:
+            gram_score.fill(0)
+            for field, weight in FIELDS:
+                ids = self.postings[field].get(gram)
+                if ids is not None:
+                    gram_score[ids] = weight
+            scores += gram_score
+        scores /= len(grams) * FIELDS[-1][1]
+        candidates = np.flatnonzero(scores >= MIN_SCORE)
+        # Room for duplicates and for the name bonus to reorder the best.
+        keep = limit * 4
+        if len(candidates) > keep:
+            candidates = candidates[np.argpartition(-scores[candidates], keep)[:keep]]
+
+        text = normalize(query)
+        ranked = []
+        for number in candidates.tolist():
+            name = self.names[number]
+            bonus = 1.0 if name.startswith(text) else 0.5 if text in name else 0.0
+            ranked.append((-float(scores[number] + bonus), len(name), name, number))
+        ranked.sort()
+        results, seen = [], set()
+        for key, _, _, number in ranked:
+            plant = self.plants[number]
+            row = (plant.get('name'), plant.get('city'), plant.get('type'), plant.get('lat'), plant.get('lon'))
+            if row in seen:
+                continue
+            seen.add(row)
+            results.append((plant, round(-key, 3)))
+            if len(results) == limit:
+                break
+        return results
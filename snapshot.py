@@ -0,0 +1,124 @@
+"""Compiled binary snapshot of the xlsx sources.
+
+``flask build-snapshot`` parses every workbook once and stores the
+resulting DataFrames in a single pickle file. Loaders call
+``read_excel`` instead of ``pd.read_excel``; it serves a frame from the
+snapshot when the snapshot was built from the exact file currently on
+disk (same mtime and size) and falls back to parsing the xlsx otherwise.
+"""
+import glob
+import os
+import pickle
+import threading
+import time
+
+import pandas as pd
+
+from datasets import is_temporary
+
+SNAPSHOT_FILE = 'data.snapshot'
+SNAPSHOT_FORMAT = 1
+
+# (pattern, read_excel keyword arguments) for every compiled source.
+SOURCES = [
+    ('data.xlsx', {}),
+    ('data1.xlsx', {}),
+    ('Sponge_Iron_Plants.xlsx', {}),
+    ('biomass.xlsx', {'sheet_name': None}),
+    ('*_biomass.xlsx', {'header': [0, 1]}),
+]
+
+_lock = threading.Lock()
+_loaded = {'stamp': None, 'entries': {}}
+
+
+def _key(path, kwargs):
+    return (os.path.basename(path), repr(sorted(kwargs.items())))
+
+
+def _file_stamp(path):
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _entries(base_dir):
+    """Return the entries of the snapshot in ``base_dir``, unpickling it once."""
+    path = os.path.join(base_dir, SNAPSHOT_FILE)
+    try:
+        stamp = (path, _file_stamp(path))
+    except OSError:
+        return {}
+    if _loaded['stamp'] != stamp:
+        with _lock:
+            if _loaded['stamp'] != stamp:
+                try:
+                    with open(path, 'rb') as f:
+                        payload = pickle.load(f)
+                    entries = payload['entries'] if payload.get('format') == SNAPSHOT_FORMAT else {}
+                except Exception as e:
+                    print(f"Error reading snapshot {path}: {str(e)}")
+                    entries = {}
+                _loaded['entries'] = entries
+                _loaded['stamp'] = stamp
+    return _loaded['entries']
+
+
+def _fresh_entry(path, kwargs):
+    entry = _entries(os.path.dirname(path)).get(_key(path, kwargs))
+    if entry is not None and entry[0] == _file_stamp(path):
+        return entry
+    return None
+
+
+def is_fresh(path, **kwargs):
+    """Return True if ``read_excel(path, **kwargs)`` would be served from the snapshot."""
+    return _fresh_entry(path, kwargs) is not None
+
+
+def read_excel(path, **kwargs):
+    """Drop-in for ``pd.read_excel`` that prefers a fresh snapshot entry."""
+    entry = _fresh_entry(path, kwargs)
+    if entry is not None:
+        frame = entry[1]
+        if isinstance(frame, dict):
+            return {name: df.copy(deep=False) for name, df in frame.items()}
+        return frame.copy(deep=False)
+    return pd.read_excel(path, **kwargs)
+
+
+def source_paths(base_dir):
+    """Yield ``(path, kwargs)`` for every workbook the snapshot covers."""
+    for pattern, kwargs in SOURCES:
+        for path in sorted(glob.glob(os.path.join(base_dir, pattern))):
+            if not is_temporary(path):
+                yield path, kwargs
+
+
+def build(base_dir):
+    """Parse every source workbook and write the snapshot atomically."""
+    entries = {}
+    for path, kwargs in source_paths(base_dir):
+        stamp = _file_stamp(path)
+        entries[_key(path, kwargs)] = (stamp, pd.read_excel(path, **kwargs))
+    target = os.path.join(base_dir, SNAPSHOT_FILE)
+    tmp = f"{target}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        pickle.dump({'format': SNAPSHOT_FORMAT, 'entries': entries}, f,
+                    protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, target)
+    return target, len(entries)
+
+
+def compare_load_times(base_dir):
+    """Time a full load from xlsx against a full load from the snapshot."""
+    start = time.perf_counter()
+    for path, kwargs in source_paths(base_dir):
+        pd.read_excel(path, **kwargs)
+    xlsx_seconds = time.perf_counter() - start
+
+    _loaded['stamp'] = None
+    start = time.perf_counter()
+    for path, kwargs in source_paths(base_dir):
+        read_excel(path, **kwargs)
+    snapshot_seconds = time.perf_counter() - start
+    return xlsx_seconds, snapshot_seconds
@@ -4,7 +4,6 @@ document.addEventListener("DOMContentLoaded", () => {
   let currentChart = null;
 
   // --- NEW: Variables for Distance Calculator ---
-  let allPlantNames = [];
   let selectedPlant1 = null;
   let selectedPlant2 = null;
   let selectedPlant1LatLon = null;
@@ -445,48 +444,53 @@ document.addEventListener("DOMContentLoaded", () => {
     }
   });
 
-  function populatePlantDataForAutocomplete(data) {
-    allPlantNames = data
-      .filter(plant => plant["Sponge Iron Plant"] && plant["City/ District"] && plant["Latitude"] && plant["Longitude"])
-      .map((plant) => ({
-        name: plant["Sponge Iron Plant"],
-        city: plant["City/ District"],
-        type: plant._type,
-        lat: plant["Latitude"],
-        lon: plant["Longitude"]
-      }));
-    allPlantNames.sort((a, b) => a.name.localeCompare(b.name));
-
-    autocomplete(plant1Input, plant1Options, allPlantNames, (plant) => {
-      selectedPlant1 = plant.city;
-      selectedPlant1LatLon = { lat: plant.lat, lon: plant.lon };
-    });
-    autocomplete(plant2Input, plant2Options, allPlantNames, (plant) => {
-      selectedPlant2 = plant.city;
-      selectedPlant2LatLon = { lat: plant.lat, lon: plant.lon };
-    });
-  }
+  // Suggestions come from /api/search, one small request per keystroke.
+  autocomplete(plant1Input, plant1Options, (plant) => {
+    selectedPlant1 = plant.city;
+    selectedPlant1LatLon = { lat: plant.lat, lon: plant.lon };
+  });
+  autocomplete(plant2Input, plant2Options, (plant) => {
+    selectedPlant2 = plant.city;
+    selectedPlant2LatLon = { lat: plant.lat, lon: plant.lon };
+  });
 
-  function autocomplete(inputElement, optionsContainer, plantList, onSelect) {
+  function autocomplete(inputElement, optionsContainer, onSelect) {
+    let pending = null;
     inputElement.addEventListener("input", function() {
-      const value = this.value.toLowerCase();
-      optionsContainer.innerHTML = "";
+      const value = this.value.trim();
+      if (pending) {
+        pending.abort();
+        pending = null;
+      }
       if (!value) {
+        optionsContainer.innerHTML = "";
         optionsContainer.style.display = "none";
         return;
       }
-      const filteredPlants = plantList.filter(plant => plant.name.toLowerCase().includes(value));
-      filteredPlants.slice(0, 10).forEach(plant => {
-        const li = document.createElement("li");
-        li.textContent = plant.name;
-        li.addEventListener("click", function() {
-          inputElement.value = plant.name;
-          onSelect(plant);
-          optionsContainer.style.display = "none";
+      pending = new AbortController();
+      fetch(`/api/search?q=${encodeURIComponent(value)}&limit=10`, { signal: pending.signal })
+        .then((response) => response.json())
+        .then((data) => {
+          const plants = data.results || [];
+          optionsContainer.innerHTML = "";
+          plants.forEach(plant => {
+            const li = document.createElement("li");
+            li.textContent = plant.name;
+            li.title = `${plant.city}, ${plant.state} (${plant.type})`;
+            li.addEventListener("click", function() {
+              inputElement.value = plant.name;
+              onSelect(plant);
+              optionsContainer.style.display = "none";
+            });
+            optionsContainer.appendChild(li);
+          });
+          optionsContainer.style.display = plants.length > 0 ? "block" : "none";
+        })
+        .catch((error) => {
+          if (error.name !== "AbortError") {
+            console.error("Error searching plants:", error);
+          }
         });
-        optionsContainer.appendChild(li);
-      });
-      optionsContainer.style.display = filteredPlants.length > 0 ? "block" : "none";
     });
 
     document.addEventListener("click", function(event) {
@@ -911,12 +915,6 @@ document.addEventListener("DOMContentLoaded", () => {
     .then((data) => {
       steelPlantData = data.steel || {};
       spongePlantData = data.sponge || {};
-      // Merge for autocomplete and distance (with type info)
-      const allPlants = [
-        ...Object.values(steelPlantData).flat().map(p => ({...p, _type: 'Steel Iron Plant'})),
-        ...Object.values(spongePlantData).flat().map(p => ({...p, _type: 'Sponge Iron Plant'})),
-      ];
-      populatePlantDataForAutocomplete(allPlants);
       plantData = { ...steelPlantData, ...spongePlantData };
       loadIndiaMap();
       highlightStatesWithPlants(); 
@@ -967,7 +965,7 @@ document.addEventListener("DOMContentLoaded", () => {
     currentStateSpongeData = [];
     currentStateDistrictsWithPlants = new Set();
 
-    fetch("/static/geojson/india.json")
+    fetch("/static/geojson/india.json?detail=medium")
       .then((response) => response.json())
       .then((data) => {
         createMap(data);
@@ -1199,7 +1197,7 @@ document.addEventListener("DOMContentLoaded", () => {
                   return;
                 }
                 const stateFile = stateName.toLowerCase().replace(/\s+/g, "");
-                fetch(`/static/geojson/states/${stateFile}.json`)
+                fetch(`/static/geojson/states/${stateFile}.json?detail=high`)
                   .then(response => response.json())
                   .then(stateData => {
                     currentView = stateName;
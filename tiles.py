@@ -0,0 +1,312 @@
+"""Mapbox Vector Tiles cut from the boundary topologies.
+
+A ``TileSet`` holds one or more layers, each built from the arc
+topologies of ``geometry.py``. For every zoom level the arcs are
+simplified to about one screen pixel (so shared borders stay shared),
+projected to Web Mercator once, and cached; a tile then only has to
+pick the features whose bounding box touches it, clip their rings to
+the tile plus a small buffer and encode them.
+
+The protobuf encoding follows the Vector Tile Specification 2.1 and is
+written by hand, so no tile library is needed. Rendered tiles are
+written to a disk cache under a directory named after a hash of the
+layer contents, so a data change never serves stale tiles and every
+worker process shares the same cache. The first tile of a new version
+removes the directories of the older ones.
+"""
+import hashlib
+import math
+import os
+import shutil
+import struct
+import threading
+
+import numpy as np
+
+EXTENT = 4096
+BUFFER = 64  # tile units of geometry kept outside the tile edge
+TILE_SIZE = 256  # screen pixels per tile, for the simplification tolerance
+MAX_LATITUDE = 85.0511287798
+MIMETYPE = 'application/vnd.mapbox-vector-tile'
+
+_MOVE_TO, _LINE_TO, _CLOSE_PATH = 1, 2, 7
+_POLYGON = 3
+
+
+def tolerance_for_zoom(zoom):
+    """Simplification tolerance in degrees: one screen pixel at ``zoom``."""
+    return 360.0 / (TILE_SIZE * 2 ** zoom)
+
+
+def mercator(lonlat):
+    """Project ``(n, 2)`` lon/lat degrees to Web Mercator world units in [0, 1]."""
+    lon = lonlat[:, 0]
+    lat = np.radians(np.clip(lonlat[:, 1], -MAX_LATITUDE, MAX_LATITUDE))
+    x = (lon + 180.0) / 360.0
+    y = 0.5 - np.log(np.tan(np.pi / 4 + lat / 2)) / (2 * np.pi)
+    return np.column_stack([x, y])
+
+
+def tile_range(zoom, west, south, east, north):
+    """Inclusive ``(x0, y0, x1, y1)`` tile indices covering a lon/lat box."""
+    n = 2 ** zoom
+    (x0, y0), (x1, y1) = mercator(np.array([[west, north], [east, south]])) * n
+    clamp = lambda v: min(max(int(math.floor(v)), 0), n - 1)
+    return clamp(x0), clamp(y0), clamp(x1), clamp(y1)
+
+
+# -- protobuf ---------------------------------------------------------------
+
+def _varint(value):
+    out = bytearray()
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _field(number, wire_type):
+    return _varint(number << 3 | wire_type)
+
+
+def _message(number, payload):
+    return _field(number, 2) + _varint(len(payload)) + payload
+
+
+def _packed(number, values):
+    return _message(number, b''.join(_varint(v) for v in values))
+
+
+def _value(value):
+    """Encode a property value as a ``Tile.Value`` message."""
+    if isinstance(value, bool):
+        return _field(7, 0) + _varint(int(value))
+    if isinstance(value, (int, np.integer)):
+        value = int(value)
+        if value >= 0:
+            return _field(5, 0) + _varint(value)
+        return _field(6, 0) + _varint((value << 1) ^ (value >> 63))
+    if isinstance(value, (float, np.floating)):
+        return _field(3, 1) + struct.pack('<d', float(value))
+    return _message(1, str(value).encode('utf-8'))
+
+
+# -- geometry ---------------------------------------------------------------
+
+def _clip(points, axis, bound, keep_above):
+    """Sutherland-Hodgman: clip an open ring against one axis-aligned half-plane."""
+    v = points[:, axis] - bound
+    inside = v >= 0 if keep_above else v <= 0
+    prev, prev_v, prev_inside = np.roll(points, 1, axis=0), np.roll(v, 1), np.roll(inside, 1)
+    crossing = inside != prev_inside
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = prev_v / (prev_v - v)
+        cut = prev + t[:, None] * (points - prev)
+    # Each edge emits its crossing point (if any) followed by its end point (if inside).
+    candidates = np.stack([cut, points], axis=1).reshape(-1, 2)
+    return candidates[np.stack([crossing, inside], axis=1).reshape(-1)]
+
+
+def _tile_ring(ring, lo, hi, exterior):
+    """Clip, round and orient one closed ring in tile units; None if nothing is left."""
+    ring = ring[:-1]
+    if ring.min(axis=0).min() < lo or ring.max(axis=0).max() > hi:
+        for axis in (0, 1):
+            ring = _clip(ring, axis, lo, True)
+            if len(ring):
+                ring = _clip(ring, axis, hi, False)
+            if len(ring) < 3:
+                return None
+    ring = np.round(ring).astype(np.int64)
+    keep = np.any(ring != np.roll(ring, 1, axis=0), axis=1)
+    ring = ring[keep]
+    if len(ring) < 3:
+        return None
+    following = np.roll(ring, -1, axis=0)
+    area = int(np.sum(ring[:, 0] * following[:, 1] - following[:, 0] * ring[:, 1]))
+    if area == 0:
+        return None
+    # Exterior rings have positive area in tile coordinates (y down), holes negative.
+    if (area > 0) != exterior:
+        ring = ring[::-1]
+    return ring
+
+
+def _geometry(rings):
+    """Encode ``(n, 2)`` integer rings as polygon drawing commands."""
+    commands = []
+    cursor = np.zeros(2, dtype=np.int64)
+    for ring in rings:
+        deltas = np.diff(np.vstack([cursor, ring]), axis=0)
+        cursor = ring[-1]
+        zigzag = ((deltas << 1) ^ (deltas >> 63)).tolist()
+        commands.append(_MOVE_TO | 1 << 3)
+        commands.extend(zigzag[0])
+        commands.append(_LINE_TO | (len(ring) - 1) << 3)
+        for dx, dy in zigzag[1:]:
+            commands.append(dx)
+            commands.append(dy)
+        commands.append(_CLOSE_PATH | 1 << 3)
+    return commands
+
+
+# -- tiles ------------------------------------------------------------------
+
+class TileLayer:
+    """One vector-tile layer made of the features of one or more topologies.
+
+    ``attributes(properties)`` may return extra attributes for a feature;
+    ``None`` values are left out of the tile.
+    """
+
+    def __init__(self, name, topologies, min_zoom=0, attributes=None):
+        self.name = name
+        self.topologies = topologies
+        self.min_zoom = min_zoom
+        self.properties = []
+        for topology in topologies:
+            for properties, _ in topology.features:
+                extra = attributes(properties) if attributes is not None else {}
+                merged = {**properties, **(extra or {})}
+                self.properties.append({k: v for k, v in merged.items() if v is not None})
+        self._zooms = {}
+        self._lock = threading.Lock()
+
+    def features(self, zoom):
+        """Return ``(bboxes, polygons)`` in world units, simplified for ``zoom``."""
+        with self._lock:
+            cached = self._zooms.get(zoom)
+            if cached is None:
+                cached = self._zooms[zoom] = self._project(tolerance_for_zoom(zoom))
+        return cached
+
+    def _project(self, tolerance):
+        polygons, bboxes = [], []
+        for topology in self.topologies:
+            arcs = [mercator(arc) for arc in topology.simplified_arcs(tolerance)]
+            for _, shape in topology.feature_polygons(arcs):
+                polygons.append(shape)
+                rings = [polygon[0] for polygon in shape]
+                if rings:
+                    stacked = np.concatenate(rings)
+                    bboxes.append(np.concatenate([stacked.min(axis=0), stacked.max(axis=0)]))
+                else:
+                    bboxes.append(np.full(4, np.nan))
+        return np.array(bboxes).reshape(-1, 4), polygons
+
+    def encode(self, zoom, x, y):
+        """Return the encoded ``Tile.Layer`` for one tile, or None if it is empty."""
+        bboxes, polygons = self.features(zoom)
+        n = 2 ** zoom
+        margin = BUFFER / EXTENT
+        west, north = (x - margin) / n, (y - margin) / n
+        east, south = (x + 1 + margin) / n, (y + 1 + margin) / n
+        hits = np.flatnonzero((bboxes[:, 0] <= east) & (bboxes[:, 2] >= west)
+                              & (bboxes[:, 1] <= south) & (bboxes[:, 3] >= north))
+        if not len(hits):
+            return None
+
+        origin = np.array([x, y], dtype=float)
+        keys, values = {}, {}
+        features = []
+        for i in hits.tolist():
+            rings = []
+            for polygon in polygons[i]:
+                exterior = _tile_ring((polygon[0] * n - origin) * EXTENT, -BUFFER, EXTENT + BUFFER, True)
+                if exterior is None:
+                    continue
+                rings.append(exterior)
+                for hole in polygon[1:]:
+                    hole = _tile_ring((hole * n - origin) * EXTENT, -BUFFER, EXTENT + BUFFER, False)
+                    if hole is not None:
+                        rings.append(hole)
+            if not rings:
+                continue
+            tags = []
+            for key, value in self.properties[i].items():
+                tags.append(keys.setdefault(key, len(keys)))
+                tags.append(values.setdefault((type(value), value), len(values)))
+            features.append(_field(1, 0) + _varint(i + 1) + _packed(2, tags)
+                            + _field(3, 0) + _varint(_POLYGON) + _packed(4, _geometry(rings)))
+        if not features:
+            return None
+
+        layer = [_field(15, 0) + _varint(2), _message(1, self.name.encode('utf-8'))]
+        layer.extend(_message(2, feature) for feature in features)
+        layer.extend(_message(3, key.encode('utf-8')) for key in keys)
+        layer.extend(_message(4, _value(value)) for _, value in values)
+        layer.append(_field(5, 0) + _varint(EXTENT))
+        return b''.join(layer)
+
+
+class TileSet:
+    """Renders and disk-caches the tiles of a list of ``TileLayer``."""
+
+    def __init__(self, layers, max_zoom=14):
+        self.layers = layers
+        self.max_zoom = max_zoom
+        digest = hashlib.sha256(repr((EXTENT, BUFFER, TILE_SIZE)).encode())
+        for layer in layers:
+            digest.update(repr((layer.name, layer.min_zoom, layer.properties)).encode())
+            for topology in layer.topologies:
+                for arc, sig in zip(topology.arcs, topology.significance):
+                    digest.update(arc.tobytes())
+                    digest.update(sig.tobytes())
+        # Names the cache directory, so tiles of older data are never served.
+        self.version = digest.hexdigest()[:16]
+
+    def bounds(self):
+        """``(west, south, east, north)`` of all features, in degrees."""
+        lo, hi = np.full(2, np.inf), np.full(2, -np.inf)
+        for layer in self.layers:
+            for topology in layer.topologies:
+                for arc in topology.simplified_arcs(0.0):
+                    lo = np.minimum(lo, arc.min(axis=0))
+                    hi = np.maximum(hi, arc.max(axis=0))
+        return float(lo[0]), float(lo[1]), float(hi[0]), float(hi[1])
+
+    def valid(self, zoom, x, y):
+        return 0 <= zoom <= self.max_zoom and 0 <= x < 2 ** zoom and 0 <= y < 2 ** zoom
+
+    def render(self, zoom, x, y):
+        """Encode tile ``zoom/x/y``; an empty tile is zero bytes."""
+        layers = []
+        for layer in self.layers:
+            if zoom >= layer.min_zoom:
+                encoded = layer.encode(zoom, x, y)
+                if encoded is not None:
+                    layers.append(_message(3, encoded))
+        return b''.join(layers)
+
+    def cached_tile(self, cache_dir, zoom, x, y):
+        """Return the path of tile ``zoom/x/y`` under ``cache_dir``, rendering it if needed."""
+        path = os.path.join(cache_dir, self.version, str(zoom), str(x), f'{y}.mvt')
+        if os.path.exists(path):
+            return path
+        if not os.path.isdir(os.path.join(cache_dir, self.version)):
+            self.prune(cache_dir)
+        data = self.render(zoom, x, y)
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        for attempt in range(2):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            try:
+                with open(tmp, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp, path)
+                break
+            except FileNotFoundError:
+                # Another worker pruned this version meanwhile; write it again.
+                if attempt:
+                    raise
+        return path
+
+    def prune(self, cache_dir):
+        """Remove the cached tiles of every other version under ``cache_dir``."""
+        try:
+            names = os.listdir(cache_dir)
+        except FileNotFoundError:
+            return
+        for name in names:
+            if name != self.version:
+                shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
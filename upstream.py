@@ -0,0 +1,147 @@
+"""Shared plumbing for calls to upstream HTTP services (OSRM, Nominatim).
+
+* ``make_session`` -- one pooled ``requests.Session`` with bounded retries
+* ``TTLCache`` -- thread-safe LRU cache whose entries also expire
+* ``CircuitBreaker`` -- stops calling an upstream after repeated failures
+* ``LatencyStats`` -- recent call latencies for the stats endpoint
+"""
+import threading
+import time
+from collections import OrderedDict, deque
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+def make_session(pool_size=20, retries=2, backoff=0.2):
+    """Return a Session that reuses connections and retries idempotent GETs."""
+    retry = Retry(total=retries, connect=retries, read=retries, backoff_factor=backoff,
+                  status_forcelist=(502, 503, 504), allowed_methods=frozenset(['GET']),
+                  raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class TTLCache:
+    """Least-recently-used cache of at most ``maxsize`` entries, each valid for ``ttl`` seconds."""
+
+    def __init__(self, maxsize=10000, ttl=86400):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] < now:
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / total, 4) if total else None,
+        }
+
+
+class CircuitBreaker:
+    """Opens after ``threshold`` consecutive failures and stays open for ``cooldown`` seconds.
+
+    After the cooldown one trial call is let through (half-open); its
+    outcome closes the breaker again or restarts the cooldown.
+    """
+
+    def __init__(self, threshold=5, cooldown=30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if not self._trial and time.monotonic() - self.opened_at >= self.cooldown:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self._trial = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half-open' if self._trial else 'open'
+
+
+class LatencyStats:
+    """Counts calls and errors and keeps the latest ``window`` latencies."""
+
+    def __init__(self, window=1000):
+        self.calls = 0
+        self.errors = 0
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds, ok=True):
+        with self._lock:
+            self.calls += 1
+            if not ok:
+                self.errors += 1
+            self._samples.append(seconds)
+
+    def stats(self):
+        with self._lock:
+            samples = sorted(self._samples)
+        result = {'calls': self.calls, 'errors': self.errors}
+        if samples:
+            result.update({
+                'latency_ms_avg': round(1000 * sum(samples) / len(samples), 1),
+                'latency_ms_p50': round(1000 * samples[len(samples) // 2], 1),
+                'latency_ms_p95': round(1000 * samples[min(len(samples) - 1, int(len(samples) * 0.95))], 1),
+            })
+        return result
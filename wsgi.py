@@ -1,4 +1,8 @@
-from app import app
+from app import app, warm
+
+# Parse every workbook and build every index before the first request
+# instead of during it (in the gunicorn master when preloading).
+warm()
 
 if __name__ == "__main__":
-    app.run()
\ No newline at end of file
+    app.run()